@@ -64,6 +64,9 @@ if __name__ == '__main__':
     # -------------------
     print(f'Dijkstra Algorithm{"." * 100}')
     Dijkstra = dijkstra.Dijkstra(env, start_node, end_node)
+    # Dijkstra = dijkstra.AStar(env, start_node, end_node)
+    # Dijkstra = dijkstra.Bidirectional(env, start_node, end_node)
+    # Dijkstra = dijkstra.TimeDependent(env, start_node, end_node, departure_time = 480)
     node_path, edge_path, *_ = Dijkstra.search()
     env.visualize_plot(edge_path)
 
@@ -83,4 +86,13 @@ if __name__ == '__main__':
     S_agent = agent.SARSA(env, start_node, end_node, exploration_rate = 0.1)
     node_path, edge_path, episode, logs = S_agent.train(num_episodes, num_converge)
     env.plot_performance(episode, logs)
+    env.visualize_plot(edge_path)
+
+    # -------------------
+    # Planner (Value Iteration)
+    # -------------------
+    print(f'\nValue Iteration Planner{"." * 100}')
+    P_agent = agent.Planner(env, start_node, end_node, method = 'value_iteration')
+    # P_agent = agent.Planner(env, start_node, end_node, method = 'sweeping')
+    node_path, edge_path, episode, logs = P_agent.train(num_episodes, num_converge)
     env.visualize_plot(edge_path)
\ No newline at end of file
@@ -1,6 +1,11 @@
 import numpy as np
-import sys
+import os, sys
+import json
+import heapq
 import datetime
+import collections
+import graph
+import episodes
 
 
 class rl_agent():
@@ -13,11 +18,29 @@ class rl_agent():
         self.env = env
         self.env.set_start_end(start_node, end_node)
 
+        # Integer states as lists for fast scalar lookups, the outgoing edges of each state in action order
+        # as small arrays for Q-table takes
+        self.start_state = self.env.node_index[self.env.start_node]
+        self.end_state = self.env.node_index[self.env.end_node]
+        self.action_edges = self.env.action_edges
+        self.state_edges = [row[row >= 0].astype(np.intp) for row in self.action_edges]
+        self.edge_to = self.env.graph.edge_to.tolist()
+        self.out_degree = self.env.graph.out_degree.tolist()
+        self.q_table = None
+
 
     # Reset/Initialize agent
-    def reset(self):
-        self.q_table = np.zeros((len(self.env.state_space), len(self.env.action_space)))
-        self.logs = {}
+    def reset(self, warm_start = False, log_file = None, threshold = 5):
+        # One Q-value per outgoing edge, indexed by edge id, the actions of a state are its state_edges
+        # A warm start keeps the learnt Q-table, e.g. to re-route after a traffic update
+        if not warm_start or self.q_table is None:
+            self.q_table = np.zeros(self.env.graph.num_edges)
+        elif not self.q_table.flags.writeable:
+            self.q_table = np.array(self.q_table) # a loaded read-only table is copied before learning
+
+        # Every route goes to the episode log, only the last threshold routes are kept for the convergence check
+        self.logs = episodes.episode_log(self.env, self.env.start_node, log_file)
+        self.recent_routes = collections.deque(maxlen = max(threshold, 1))
         self.best_result = 0
 
 
@@ -25,157 +48,535 @@ class rl_agent():
         pass
 
 
-    def step(self, action, state_list, edge_list):
-        # initialize step
-        terminate = False
-        current_state = state_list[-1]
-        current_edge = edge_list[-1] if edge_list else None
+    def act_batch(self):
+        pass
+
+
+    # Cost of a route of edge ids
+    def evaluate(self, edge_list):
+        travel_edges = [self.env.edges[edge] for edge in edge_list]
+        if self.env.evaluation in ("distance", "d"):
+            return self.env.get_edge_distance(travel_edges)
+        return self.env.get_edge_time(travel_edges)
 
+
+    # Reward parameters
+    def get_rewards(self):
         # reward paramaters
         # -------------------
         # START OF EDIT
         # -------------------
-        invalid_action_reward = -50
         dead_end_reward = -50
         # loop_reward = -50
         loop_reward = -30
         completion_reward = 50
-        bonus_reward = 50 
-        # bonus_reward = ((self.best_result-current_result)/self.best_result)*100 + 50
         continue_reward = 0
         # -------------------
         # END OF EDIT
         # -------------------
+        return dead_end_reward, loop_reward, completion_reward, continue_reward
 
-        # Get list of outgoing edges     
-        outgoing_edges = self.env.decode_node_to_edges(current_state, direction = 'outgoing')
-        reward = continue_reward
 
-        # Compute reward and next state
-        # Out-Of-Bound Action
-        if action not in self.env.decode_edges_to_actions(outgoing_edges):
-            reward += invalid_action_reward
-            next_state = current_state
-            next_edge = current_edge
+    # Reward a completed route if it is the shortest distance/time so far
+    def reward_route(self, edge_list):
+        current_result = self.evaluate(edge_list)
 
-        # Valid Action
-        else:
-            next_edge = self.env.decode_edges_action_to_edge(outgoing_edges, action)
-            next_state = self.env.decode_edge_to_node(next_edge, direction = 'end')
+        # -------------------
+        # START OF EDIT
+        # -------------------
+        bonus_reward = 50
+        # bonus_reward = ((self.best_result-current_result)/self.best_result)*100 + 50
+        # -------------------
+        # END OF EDIT
+        # -------------------
 
-            # Completed Route
-            if next_state in self.env.end_node:
-                reward += completion_reward
-                terminate = True
+        # evaluation
+        if self.best_result == 0:
+            self.best_result = current_result
+        elif current_result < self.best_result:
+            edge_index = np.asarray(edge_list[:-1], dtype = np.int64)
+            np.add.at(self.q_table, edge_index, bonus_reward)
+            self.best_result = current_result
 
-                # check if the route is the shortest distance/time
-                if self.env.evaluation in ("distance", "d"):
-                    current_result = self.env.get_edge_distance(edge_list + [next_edge])
-                else:
-                    current_result = self.env.get_edge_time(edge_list + [next_edge])
 
-                # evaluation
-                if self.best_result == 0:
-                    self.best_result = current_result
-                elif current_result < self.best_result:
-                    for edge in edge_list:
-                        state_index = self.env.state_space.index(self.env.decode_edge_to_node(edge, direction = 'start'))
-                        action_index = self.env.edge_label[edge]
-                        self.q_table[state_index][action_index] += bonus_reward
-                    self.best_result = current_result
-
-            # Dead-end Route
-            elif not self.env.decode_node_to_edges(next_state, direction = 'outgoing'):
-                reward += dead_end_reward
-                terminate = True
-
-                # Backtrack and find bottleneck
-                for edge in reversed(edge_list):
-                    if len(self.env.decode_node_to_edges(self.env.decode_edge_to_node(edge, direction = 'end'), direction = 'outgoing')) > 1:
-                        break
-
-                    state_index = self.env.state_space.index(self.env.decode_edge_to_node(edge, direction = 'start'))
-                    action_index = self.env.edge_label[edge]
-                    self.q_table[state_index][action_index] += dead_end_reward
-            
-            # Travelling
-            elif current_edge != None:
-                if (current_edge, next_edge) in [(edge_list[i], edge_list[i+1]) for i in range(len(edge_list)-1)]: # Check if its in a loop
-                    reward += loop_reward
+    # Find the edges leading into a dead-end
+    def dead_end_edges(self, edge_list):
+        # Backtrack and find bottleneck
+        bottleneck = []
+        for edge in reversed(edge_list):
+            if self.out_degree[self.edge_to[edge]] > 1:
+                break
+            bottleneck.append(edge)
+        return bottleneck
+
+
+    # Punish the edges leading into a dead-end
+    def reward_dead_end(self, edge_list, dead_end_reward):
+        for edge in self.dead_end_edges(edge_list):
+            self.q_table[edge] += dead_end_reward
+
+
+    def step(self, action, state_list, edge_list, visited_transitions):
+        # initialize step
+        terminate = False
+        current_state = state_list[-1]
+        current_edge = edge_list[-1] if edge_list else None
+
+        dead_end_reward, loop_reward, completion_reward, continue_reward = self.get_rewards()
+        reward = continue_reward
+
+        # Compute reward and next state, every action is an outgoing edge so none is out of bound
+        next_edge = int(self.state_edges[current_state][action])
+        next_state = self.edge_to[next_edge]
+
+        # Completed Route
+        if next_state == self.end_state:
+            reward += completion_reward
+            terminate = True
+            self.reward_route(edge_list + [next_edge])
+
+        # Dead-end Route
+        elif not self.out_degree[next_state]:
+            reward += dead_end_reward
+            terminate = True
+            self.reward_dead_end(edge_list, dead_end_reward)
+
+        # Travelling
+        elif current_edge != None:
+            if (current_edge, next_edge) in visited_transitions: # Check if its in a loop
+                reward += loop_reward
 
         return next_edge, next_state, reward, terminate
 
 
     def learn(self, current_state, action, next_state, reward):
-        # Update the Q-table
-        q_predict = self.q_table[self.env.state_space.index(current_state)][action]
-        q_target = reward + self.discount_factor * np.max(self.q_table[self.env.state_space.index(next_state)])
-        self.q_table[self.env.state_space.index(current_state)][action] += self.learning_rate * (q_target - q_predict)
+        # Update the Q-table, a state without outgoing edges is worth 0
+        edge = self.state_edges[current_state][action]
+        next_edges = self.state_edges[next_state]
+        q_predict = self.q_table[edge]
+        q_target = reward + self.discount_factor * (self.q_table.take(next_edges).max() if len(next_edges) else 0)
+        self.q_table[edge] += self.learning_rate * (q_target - q_predict)
+
+
+    # Update the Q-table for a batch of steps
+    def learn_batch(self, states, actions, next_states, rewards):
+        edges = self.action_edges[states, actions]
+        q_target = rewards + self.discount_factor * self.max_q_values(next_states)
+        q_delta = self.learning_rate * (q_target - self.q_table[edges])
+        counts = np.bincount(edges, minlength = self.q_table.size)
+        np.add.at(self.q_table, edges, q_delta / counts[edges])
+
+
+    # Q-values of a batch of states, padded with -inf beyond each state's outgoing edges
+    def state_q_values(self, states):
+        edges = self.action_edges[states]
+        return np.where(edges >= 0, self.q_table[edges], -np.inf)
+
+
+    # Highest Q-value of a batch of states, 0 for states without outgoing edges
+    def max_q_values(self, states):
+        q_values = self.state_q_values(states).max(axis = 1)
+        q_values[np.isneginf(q_values)] = 0
+        return q_values
 
 
-    def train(self, num_episodes, threshold):
+    def train(self, num_episodes, threshold, exit_on_failure = True, warm_start = False, log_file = None):
         start_time = datetime.datetime.now() # time the training process
-        self.reset()
+        self.reset(warm_start, log_file, threshold)
         # print('Training Started...')
 
+        # A start node without outgoing edges has no action to take
+        if self.start_state != self.end_state and not self.out_degree[self.start_state]:
+            if exit_on_failure:
+                self.training_failed(num_episodes, start_time)
+            return None
+
         for episode in range(num_episodes):
             # Initialize state
-            state_journey = [self.env.start_node]
+            state_journey = [self.start_state]
             edge_journey = []
+            visited_transitions = set()
             terminate = False
 
             # Iterate till terminate
             while True:
                 last_state = state_journey[-1]
-                if terminate or last_state in self.env.end_node:
+                if terminate or last_state == self.end_state:
                     break
 
                 action = self.act(last_state)
-                next_edge, next_state, reward, terminate = self.step(action, state_journey, edge_journey)
+                next_edge, next_state, reward, terminate = self.step(action, state_journey, edge_journey, visited_transitions)
 
                 # Learn from the outcome
                 self.learn(last_state, action, next_state, reward)
 
                 # Update state
                 if last_state != next_state:
+                    if edge_journey:
+                        visited_transitions.add((edge_journey[-1], next_edge))
                     edge_journey.append(next_edge)
                     state_journey.append(next_state)
 
             # Append to logs and print after every episode
-            self.logs[episode] = [state_journey, edge_journey]
-            
+            self.logs.append(edge_journey)
+            self.recent_routes.append(edge_journey)
+
             # print(f'{episode}: {self.logs[episode]}')
 
             # Compute Convergence
-            if episode > threshold and self.logs[episode][0][-1] == self.env.end_node:
-
-                # Convergence when 5 consecutive same routes produced
-                threshold_lst = list(self.logs.values())[-threshold:]
-                if all(x == threshold_lst[0] for x in threshold_lst):
-                    end_time = datetime.datetime.now()
-                    time_difference = end_time - start_time
-                    processing_seconds = time_difference.total_seconds()
-
-                    # --- results output ---
-                    print('Training Completed...\n')
-                    print(f'Episode {episode}:\n-- States: {self.logs[episode][0]} \n-- Edges: {self.logs[episode][1]}')
-                    print(f'-- Processing Time: {processing_seconds} seconds')
-                    
-                    if self.env.evaluation in ("distance", "d"):
-                        print(f'-- Distance travelled: {round(self.env.get_edge_distance(self.logs[episode][1]), 2)} m')
-                    else:
-                        print(f'-- Travelled Time taken: {round(self.env.get_edge_time(self.logs[episode][1]), 2)} mins')
-
-                    return self.logs[episode][0], self.logs[episode][1], episode, self.logs
+            result = self.check_convergence(episode, threshold, start_time)
+            if result:
+                return result
 
             # Unable to converge
-            if episode+1 == num_episodes:
-                print('Training Completed...')
-                end_time = datetime.datetime.now()
-                time_difference = end_time - start_time
-                processing_seconds = time_difference.total_seconds()
-                print(f'-- Processing Time: {processing_seconds} seconds')
-                sys.exit(f'Couldnt find shortest path with {num_episodes} episodes')
+            if episode+1 == num_episodes and exit_on_failure:
+                self.training_failed(num_episodes, start_time)
+
+        self.logs.flush()
+
+
+    # Run a batch of episodes at once
+    def train_batch(self, num_episodes, threshold, batch_size = 32, exit_on_failure = True, warm_start = False, log_file = None):
+        """
+        Trains batch_size independent episodes stepped together as NumPy vectors. An episode that ends is
+        logged and its row starts the next episode at the following step, so no row waits for the others.
+        Q-updates of a step are applied with np.add.at, updates to the same (state, action) within a step
+        are averaged and a dead-end reached by several episodes is punished once, so the effective learning
+        rate does not grow with the batch size. The ended episodes of a step are rewarded, logged and checked
+        for convergence together, in row order, with the rules of train.
+
+        This is not a faster way to converge. It runs 2-10x the steps per second of train, but every step
+        still waits for the Q-updates of the step before. The rows of an agent without exploration repeat
+        the same episode, and exploring rows disturb the shared Q-table, so it needs more episodes than
+        train and converges later on the bundled networks. A batch_size of 1 runs train.
+
+        Args:
+        - num_episodes (int): The maximum number of episodes
+        - threshold (int): The number of consecutive episodes with the same route needed to converge
+        - batch_size (int): The number of episodes run at once
+        - exit_on_failure (bool): Whether to exit when the batch does not converge, otherwise None is returned
+        - warm_start (bool): Whether to continue from the current Q-table instead of zeros
+        - log_file (str or None): Stream the episode logs to this file, see episodes.episode_log
+
+        Returns:
+        - The states, edges, last episode and logs of the converged route, as train
+        """
+
+        if batch_size <= 1 or self.start_state == self.end_state or not self.out_degree[self.start_state]:
+            return self.train(num_episodes, threshold, exit_on_failure, warm_start, log_file)
+
+        start_time = datetime.datetime.now() # time the training process
+        self.reset(warm_start, log_file, threshold)
+        dead_end_reward, loop_reward, completion_reward, continue_reward = self.get_rewards()
+        bonus_reward = 50 # as in reward_route
+
+        # Outcome and reward of stepping onto each edge, 1 completes the route and 2 enters a dead-end
+        graph = self.env.graph
+        edge_to = graph.edge_to.astype(np.int64)
+        outcomes = np.where(edge_to == self.end_state, 1, np.where(graph.out_degree[edge_to] == 0, 2, 0))
+        edge_rewards = continue_reward + np.select([outcomes == 1, outcomes == 2], [completion_reward, dead_end_reward])
+        branching = graph.out_degree[edge_to] > 1
+        edge_cost = self.env.get_edge_weights()
+        source_cost = self.env.get_source_weights()
+        num_actions = self.action_edges.shape[1]
+
+        # Every row runs its own episode. Transitions are marked at (last edge, action), the first step
+        # of an episode has no last edge and marks a padding column at the end.
+        batch_size = min(batch_size, num_episodes)
+        rows = np.arange(batch_size)
+        states = np.full(batch_size, self.start_state, dtype = np.int64)
+        last_edges = np.full(batch_size, -1, dtype = np.int64)
+        lengths = np.zeros(batch_size, dtype = np.int64)
+        edge_journeys = np.zeros((batch_size, 64), dtype = np.int64)
+        visited_transitions = np.zeros((batch_size, (graph.num_edges + 1) * num_actions), dtype = bool)
+        longest = 0
+        started = batch_size
+        episode = -1
+
+        # The last logged route and the run of identical completed routes it ends
+        previous_route = None
+        previous_run = 0
+
+        # Iterate till every episode terminates
+        while len(rows):
+            actions = self.act_batch(states)
+            next_edges = self.action_edges[states, actions]
+            next_states = edge_to[next_edges]
+
+            # Rewards
+            step_outcomes = outcomes[next_edges]
+            transition_keys = last_edges * num_actions + actions
+            looping = visited_transitions[rows, transition_keys] & (step_outcomes == 0)
+            rewards = edge_rewards[next_edges] + loop_reward * looping
+
+            # Update the travelled edges
+            if longest == edge_journeys.shape[1]:
+                edge_journeys = np.concatenate([edge_journeys, np.zeros_like(edge_journeys)], axis = 1)
+            visited_transitions[rows, transition_keys] = True
+            edge_journeys[rows, lengths] = next_edges
+            lengths += 1
+            longest += 1
+
+            # Ended episodes in row order, their routes padded with -1
+            ended = np.flatnonzero(step_outcomes)
+            result = None
+            if len(ended):
+                ended_lengths = lengths[ended]
+                columns = np.arange(ended_lengths.max())
+                in_route = columns < ended_lengths[:, None]
+                journeys = np.where(in_route, edge_journeys[ended, :len(columns)], -1)
+                completed = step_outcomes[ended] == 1
+
+                # Runs of identical completed routes, carried over from the episodes of earlier steps
+                same = np.zeros(len(ended), dtype = bool)
+                same[1:] = completed[1:] & completed[:-1] & (journeys[1:] == journeys[:-1]).all(axis = 1)
+                same[0] = completed[0] and previous_route is not None and journeys[0, :ended_lengths[0]].tolist() == previous_route
+                positions = np.arange(len(ended))
+                run_starts = np.maximum.accumulate(np.where(same, -1, positions))
+                runs = np.where(run_starts >= 0, positions - run_starts + 1, previous_run + positions + 1)
+
+                # Compute Convergence, the first episode after threshold that ends a long enough run
+                converged = np.flatnonzero(completed & (runs >= max(threshold, 1)) & (episode + 1 + positions > threshold))
+                if len(converged):
+                    last = converged[0] + 1
+                    ended, ended_lengths, in_route, journeys, completed = ended[:last], ended_lengths[:last], in_route[:last], journeys[:last], completed[:last]
+                    result = int(episode + last)
+
+                # Reward the completed routes shorter than every route before them, the costs are summed in
+                # route order so the padding never changes the cost of a route
+                route_costs = np.where(in_route, edge_cost[journeys], 0)
+                route_costs[:, 0] += source_cost[journeys[:, 0]]
+                route_costs = np.where(completed, route_costs.cumsum(axis = 1)[:, -1], np.inf)
+                best_before = np.minimum.accumulate(np.concatenate([[self.best_result or np.inf], route_costs]))
+                bonus = route_costs < best_before[:-1]
+                if self.best_result == 0:
+                    bonus[np.argmax(completed)] = False # the first completed route only sets the best result
+                np.add.at(self.q_table, journeys[bonus][columns < ended_lengths[bonus, None] - 1], bonus_reward)
+                if completed.any():
+                    self.best_result = best_before[-1]
+
+                # Episodes reaching the same dead-end punish its edges once, back to the last branching node
+                dead_end = ~completed
+                if dead_end.any():
+                    before_last = columns < ended_lengths[dead_end, None] - 1
+                    branches = branching[journeys[dead_end]] & before_last
+                    last_branch = np.where(branches.any(axis = 1), len(columns) - 1 - np.argmax(branches[:, ::-1], axis = 1), -1)
+                    bottleneck = journeys[dead_end][before_last & (columns > last_branch[:, None])]
+                    self.q_table[np.unique(bottleneck)] += dead_end_reward
+
+                # Log the routes
+                values = journeys[in_route].tolist()
+                offsets = np.concatenate([[0], np.cumsum(ended_lengths)]).tolist()
+                self.logs.extend([values[offsets[row]:offsets[row+1]] for row in range(len(ended))])
+                previous_route = values[offsets[-2]:]
+                previous_run = int(runs[len(ended) - 1]) if completed[-1] else 0
+                episode += len(ended)
+
+            # Learn from the outcome
+            self.learn_batch(states, actions, next_states, rewards)
+            if result is not None:
+                self.logs.flush()
+                state_journey, edge_journey = self.logs[result]
+                self.print_results(result, state_journey, edge_journey, start_time)
+                return state_journey, edge_journey, result, self.logs
+
+            # Update state
+            states = next_states
+            last_edges = next_edges
+            if not len(ended):
+                continue
+
+            # Restart the ended rows, rows past the last episode are dropped
+            states[ended] = self.start_state
+            last_edges[ended] = -1
+            lengths[ended] = 0
+            visited_transitions[ended] = False
+            if started + len(ended) > num_episodes:
+                keep = np.ones(len(rows), dtype = bool)
+                keep[ended[num_episodes - started:]] = False
+                rows = np.arange(keep.sum())
+                states, last_edges, lengths = states[keep], last_edges[keep], lengths[keep]
+                edge_journeys, visited_transitions = edge_journeys[keep], visited_transitions[keep]
+            started = min(started + len(ended), num_episodes)
+            longest = int(lengths.max(initial = 0))
+
+        # Unable to converge
+        self.logs.flush()
+        if exit_on_failure:
+            self.training_failed(num_episodes, start_time)
+
+
+    # Follow the highest Q-values from a state
+    def greedy_route(self, state):
+        """
+        Walks the argmax action of every state from the given state.
+
+        Args:
+        - state (int): The index of the starting state
+
+        Returns:
+        - The list of edge ids (int) to the end node, or None if the walk hits a dead-end or a loop
+        """
+
+        edge_list = []
+        visited = {state}
+        while state != self.end_state:
+            state_edges = self.state_edges[state]
+            if not len(state_edges):
+                return None
+            edge = int(state_edges[self.q_table.take(state_edges).argmax()])
+            state = self.edge_to[edge]
+            if state in visited:
+                return None
+            visited.add(state)
+            edge_list.append(edge)
+        return edge_list
+
+
+    # Greedy route without training
+    def route(self, start_node = None):
+        """
+        Follows the highest Q-values of the trained or loaded Q-table to the end node.
+
+        Args:
+        - start_node (str or None): The ID of the starting node, defaults to the agent's start node
+
+        Returns:
+        - node_path (list): The nodes (str) of the route, or None if the Q-table has no route from start_node
+        - edge_path (list): The edges (str) of the route, or None
+        """
+
+        start_node = self.env.start_node if start_node is None else start_node
+        if start_node not in self.env.node_index:
+            sys.exit('Error: Invalid Start Node!')
+        if self.q_table is None:
+            sys.exit('Error: The agent has not been trained or loaded!')
+
+        edge_list = self.greedy_route(self.env.node_index[start_node])
+        if edge_list is None:
+            return None, None
+        return [start_node] + [self.env.nodes[self.edge_to[edge]] for edge in edge_list], [self.env.edges[edge] for edge in edge_list]
+
+
+    # Write the Q-table to disk
+    def save(self, output_file):
+        """
+        Stores the Q-table as <output_file>.npy, which can be memory-mapped, and its states, edges,
+        end node, evaluation and network hash as <output_file>.json.
+
+        Args:
+        - output_file (str): The path of the files without extension
+        """
+
+        if self.q_table is None:
+            sys.exit('Error: The agent has not been trained!')
+
+        # write to temporary files first so a serving process never maps a partial table
+        temp_file = f'{output_file}.{os.getpid()}.tmp'
+        with open(temp_file, 'wb') as file:
+            np.save(file, np.ascontiguousarray(self.q_table))
+        os.replace(temp_file, f'{output_file}.npy')
+
+        metadata = {
+            'agent': type(self).__name__,
+            'network_file': os.path.basename(self.env.network_file),
+            'network_hash': graph.file_hash(self.env.network_file),
+            'start_node': self.env.start_node,
+            'end_node': self.env.end_node,
+            'evaluation': self.env.evaluation,
+            'learning_rate': self.learning_rate,
+            'discount_factor': self.discount_factor,
+            'states': list(self.env.state_space),
+            'edges': list(self.env.edges),
+        }
+        with open(temp_file, 'w') as file:
+            json.dump(metadata, file)
+        os.replace(temp_file, f'{output_file}.json')
+
+
+    # Read a Q-table written by save
+    def load(self, input_file, mmap = True):
+        """
+        Loads a saved Q-table for the agent's network, end node and evaluation. With mmap the table is mapped
+        read-only so serving processes share one copy, training on it makes a private copy first.
+
+        Args:
+        - input_file (str): The path of the files without extension
+        - mmap (bool): Whether to memory-map the Q-table instead of reading it into memory
+        """
+
+        with open(f'{input_file}.json') as file:
+            metadata = json.load(file)
+
+        # The table only holds for the same network, index maps, end node and evaluation
+        if metadata['network_hash'] != graph.file_hash(self.env.network_file):
+            sys.exit(f'Error: {input_file} was trained on a different network!')
+        if metadata['states'] != list(self.env.state_space) or metadata['edges'] != list(self.env.edges):
+            sys.exit(f'Error: {input_file} has different states or edges!')
+        if metadata['end_node'] != self.env.end_node:
+            sys.exit(f'Error: {input_file} was trained for the end node {metadata["end_node"]}!')
+        if (metadata.get('evaluation') in ("distance", "d")) != (self.env.evaluation in ("distance", "d")):
+            sys.exit(f'Error: {input_file} was trained for the {metadata.get("evaluation")} evaluation!')
+
+        self.q_table = np.load(f'{input_file}.npy', mmap_mode = 'r' if mmap else None)
+        self.logs = episodes.episode_log(self.env, self.env.start_node)
+        self.best_result = 0
+
+
+    # Check if the last episodes converged
+    def check_convergence(self, episode, threshold, start_time):
+        """
+        Checks whether the last threshold episodes, kept in recent_routes, produced the same complete route
+        and prints the results.
+
+        Args:
+        - episode (int): The episode just logged
+        - threshold (int): The number of consecutive identical routes needed to converge
+        - start_time (datetime): The start of the training
+
+        Returns:
+        - The states, edges, episode and logs of the converged route, or None
+        """
+
+        edge_journey = self.recent_routes[-1]
+        completed = self.edge_to[edge_journey[-1]] == self.end_state if edge_journey else self.start_state == self.end_state
+        if episode > threshold and completed:
+
+            # Convergence when 5 consecutive same routes produced
+            if all(route == edge_journey for route in self.recent_routes):
+                self.logs.flush()
+                state_journey, edge_journey = self.logs[episode]
+                self.print_results(episode, state_journey, edge_journey, start_time)
+                return state_journey, edge_journey, episode, self.logs
+        return None
+
+
+    # Print the converged route
+    def print_results(self, episode, state_journey, edge_journey, start_time):
+        end_time = datetime.datetime.now()
+        time_difference = end_time - start_time
+        processing_seconds = time_difference.total_seconds()
+
+        # --- results output ---
+        print('Training Completed...\n')
+        print(f'Episode {episode}:\n-- States: {state_journey} \n-- Edges: {edge_journey}')
+        print(f'-- Processing Time: {processing_seconds} seconds')
+
+        if self.env.evaluation in ("distance", "d"):
+            print(f'-- Distance travelled: {round(self.env.get_edge_distance(edge_journey), 2)} m')
+        else:
+            print(f'-- Travelled Time taken: {round(self.env.get_edge_time(edge_journey), 2)} mins')
+
+
+    # Stop when the training did not converge
+    def training_failed(self, num_episodes, start_time):
+        self.logs.flush()
+        print('Training Completed...')
+        end_time = datetime.datetime.now()
+        time_difference = end_time - start_time
+        processing_seconds = time_difference.total_seconds()
+        print(f'-- Processing Time: {processing_seconds} seconds')
+        sys.exit(f'Couldnt find shortest path with {num_episodes} episodes')
 
 
 class SARSA(rl_agent):
@@ -188,16 +589,25 @@ class SARSA(rl_agent):
 
 
     def act(self, state):
-        if np.random.random() < self.exploration_rate:
+        # Explore as often as a random one of the four direction labels is a valid move, without the invalid steps
+        if np.random.random() < self.exploration_rate * self.out_degree[state] / len(self.env.action_space):
             # Exploration
-            action = np.random.choice(len(self.env.action_space))
+            action = np.random.choice(self.out_degree[state])
         else:
             # Exploitation
-            state_index = self.env.state_space.index(state)
-            action = np.argmax(self.q_table[state_index])
+            action = self.q_table.take(self.state_edges[state]).argmax()
         return action
 
 
+    def act_batch(self, states):
+        # Exploitation, with random actions for the exploring episodes
+        out_degree = self.env.graph.out_degree[states]
+        actions = np.argmax(self.state_q_values(states), axis = 1)
+        explore = np.random.random(len(states)) < self.exploration_rate * out_degree / len(self.env.action_space)
+        actions[explore] = np.random.randint(out_degree[explore])
+        return actions
+
+
 class Q_Learning(rl_agent):
     def __init__ (self, env, start_node, end_node, learning_rate = 0.9, discount_factor = 0.1):
         # Inherit from main agent class
@@ -206,6 +616,192 @@ class Q_Learning(rl_agent):
 
     def act(self, state):
         # Choose action with Highest Q-value
-        state_index = self.env.state_space.index(state)
-        action = np.argmax(self.q_table[state_index])
+        action = self.q_table.take(self.state_edges[state]).argmax()
         return action
+
+
+    def act_batch(self, states):
+        # Choose actions with Highest Q-value
+        return np.argmax(self.state_q_values(states), axis = 1)
+
+
+class Planner(rl_agent):
+    def __init__ (self, env, start_node, end_node, discount_factor = 1.0, method = 'value_iteration'):
+        """
+        Solves the Q-table from the known network instead of sampling episodes. The reward of an edge is
+        minus its cost, so the greedy route is the shortest route. Edges that cannot reach the end node
+        rank lowest. The Q-table has the layout of the other agents and can be saved, routed on or used
+        as their warm start.
+
+        Args:
+        - env (traffic_env): The environment
+        - start_node (str): The ID of the starting node
+        - end_node (str): The ID of the ending node
+        - discount_factor (float): The discount of future rewards in (0, 1], 1.0 gives the exact shortest routes
+        - method (str): value_iteration for synchronous whole-array updates or sweeping for prioritized sweeping
+        """
+
+        # Inherit from main agent class, nothing is learnt from samples
+        super().__init__(env, start_node, end_node, 0, discount_factor)
+        if method not in ('value_iteration', 'sweeping'):
+            sys.exit(f'Invalid method: {method}')
+        if not 0 < discount_factor <= 1:
+            sys.exit('Error: The discount factor must be in (0, 1]!')
+        self.method = method
+        self.iterations = 0
+
+
+    # Transition table and rewards of the network
+    def build_model(self):
+        """
+        Sets:
+        - next_state (np.ndarray): The state reached by each edge
+        - reward (np.ndarray): The reward of taking each edge
+        - completed (np.ndarray): Whether each edge reaches the end node
+        - dead_end (np.ndarray): Whether each edge ends in a dead-end
+        """
+
+        _, _, _, continue_reward = self.get_rewards()
+        graph = self.env.graph
+
+        # The first edge of the agent's route also pays its source cost
+        cost = self.env.get_edge_weights()
+        start_edges = self.state_edges[self.start_state]
+        cost[start_edges] += self.env.get_source_weights()[start_edges]
+
+        self.next_state = graph.edge_to.astype(np.intp)
+        self.completed = self.next_state == self.end_state
+        self.dead_end = (graph.out_degree[self.next_state] == 0) & ~self.completed
+        self.reward = continue_reward - cost
+
+
+    # Synchronous value iteration
+    def value_iteration(self, max_iterations):
+        """
+        Updates every Q-value at once from the state values of the previous sweep. Values start at -inf
+        and only rise, so each sweep extends the solved region by one edge and edges that cannot reach
+        the end node stay at -inf.
+
+        Returns:
+        - The Q-table (np.ndarray) and the number of sweeps (int)
+        """
+
+        # Episodes end at the end node, dead-ends are never worth anything
+        completed = self.completed
+        q_table = np.where(completed, self.reward, -np.inf)
+        fixed = np.where(self.dead_end, -np.inf, self.reward)
+        action_edges = self.action_edges
+        has_edges = action_edges >= 0
+
+        for iteration in range(1, max_iterations + 1):
+            state_value = np.where(has_edges, q_table[action_edges], -np.inf).max(axis = 1)
+            new_q = np.where(completed, self.reward, fixed + self.discount_factor * state_value[self.next_state])
+            if np.array_equal(new_q, q_table):
+                return q_table, iteration
+            q_table = new_q
+        return q_table, max_iterations
+
+
+    # Prioritized sweeping
+    def sweeping(self, max_iterations):
+        """
+        Backs up the states from the end node outwards. A state whose value rose is queued and its
+        incoming edges are updated when it is popped, the highest value first, so with non-positive step
+        rewards every state is settled by one backup, as in Dijkstra.
+
+        Returns:
+        - The Q-table (np.ndarray) and the number of backups (int)
+        """
+
+        graph = self.env.graph
+        in_offsets, in_edges = graph.in_offsets.tolist(), graph.in_edges.tolist()
+        edge_from = graph.edge_from.tolist()
+        reward, terminal = self.reward.tolist(), (self.completed | self.dead_end).tolist()
+        discount_factor = self.discount_factor
+
+        # Episodes end at the end node, dead-ends are never worth anything
+        q_table = [r if completed else float('-inf') for r, completed in zip(reward, self.completed.tolist())]
+        state_value = [float('-inf')] * graph.num_nodes
+        priority_queue = []
+        for edge in np.flatnonzero(self.completed).tolist():
+            if q_table[edge] > state_value[edge_from[edge]]:
+                state_value[edge_from[edge]] = q_table[edge]
+                priority_queue.append((-q_table[edge], edge_from[edge]))
+        heapq.heapify(priority_queue)
+
+        backups = 0
+        while priority_queue and backups < max_iterations:
+            value, state = heapq.heappop(priority_queue)
+            if -value < state_value[state]:
+                continue
+            backups += 1
+
+            # The Bellman error of an edge into the state is the rise of its target
+            for index in range(in_offsets[state], in_offsets[state+1]):
+                edge = in_edges[index]
+                if terminal[edge]:
+                    continue
+                q_target = reward[edge] + discount_factor * state_value[state]
+                if q_target > q_table[edge]:
+                    q_table[edge] = q_target
+                    if q_target > state_value[edge_from[edge]]:
+                        state_value[edge_from[edge]] = q_target
+                        heapq.heappush(priority_queue, (-q_target, edge_from[edge]))
+
+        return np.array(q_table), backups
+
+
+    # Solve the Q-table
+    def plan(self, max_iterations = None):
+        """
+        Builds the model from the current traffic and solves it with the agent's method.
+
+        Args:
+        - max_iterations (int or None): The largest number of sweeps or backups, defaults to enough to converge
+
+        Returns:
+        - The Q-table (np.ndarray)
+        """
+
+        self.build_model()
+        if max_iterations is None:
+            max_iterations = self.env.graph.num_nodes + 1 if self.method == 'value_iteration' else 10 * self.env.graph.num_edges
+        q_table, self.iterations = getattr(self, self.method)(max_iterations)
+
+        # Edges that cannot reach the end node rank below every other edge by the dead-end reward,
+        # finite so learning can continue
+        reachable = np.isfinite(q_table)
+        dead_end_reward, _, _, _ = self.get_rewards()
+        floor = (q_table[reachable].min() if reachable.any() else 0) - abs(dead_end_reward)
+        q_table[~reachable] = floor
+        self.q_table = q_table
+        return q_table
+
+
+    # Plan and return the greedy route like the trained agents
+    def train(self, num_episodes = None, threshold = 5, exit_on_failure = True, warm_start = False, log_file = None):
+        """
+        Solves the Q-table and logs its greedy route as the only episode. num_episodes and warm_start are
+        accepted for the interface of the other agents, the table is always solved from scratch.
+
+        Returns:
+        - The states, edges, episode and logs of the route, or None if the end node is unreachable
+        """
+
+        start_time = datetime.datetime.now() # time the planning process
+        self.reset(False, log_file, threshold)
+        self.plan()
+
+        edge_journey = self.greedy_route(self.start_state)
+        if edge_journey is None:
+            if exit_on_failure:
+                self.training_failed(self.iterations, start_time)
+            self.logs.flush()
+            return None
+
+        self.logs.append(edge_journey)
+        self.logs.flush()
+        state_journey, edge_journey = self.logs[0]
+        self.print_results(0, state_journey, edge_journey, start_time)
+        print(f'-- {"Sweeps" if self.method == "value_iteration" else "Backups"}: {self.iterations}')
+        return state_journey, edge_journey, 0, self.logs
@@ -0,0 +1,217 @@
+import sys
+import multiprocessing as mp
+
+import numpy as np
+import dijkstra
+
+
+# Per-process search engine, inherited from the parent on fork or built once by init_worker
+worker_engine = None
+
+
+class assignment_result:
+    def __init__ (self, env, flows, times, free_times, gaps, unassigned):
+        # Vehicles per hour and travel time (in minutes) of every edge at equilibrium
+        self.env = env
+        self.flows = flows
+        self.times = times
+
+        # Travel time of every edge without the assigned traffic
+        self.free_times = free_times
+
+        # Relative gap after every iteration, and the demand without any route
+        self.gaps = gaps
+        self.iterations = len(gaps)
+        self.unassigned = unassigned
+
+
+    # Delays of the assigned traffic in the format of update_traffic
+    def congested(self, min_delay = 0.01):
+        """
+        Args:
+        - min_delay (float): The smallest delay to report (in minutes)
+
+        Returns:
+        - A list of (edge, minutes) pairs with the existing congestion plus the delay of the assigned flows
+        """
+
+        delay = self.times - self.free_times
+        edges = np.flatnonzero(delay >= min_delay)
+        return [(self.env.edges[edge], float(self.env.edge_congestion[edge] + delay[edge])) for edge in edges]
+
+
+# Travel times of the edges under a flow
+def bpr_times(free_times, fixed_times, flows, capacity, alpha = 0.15, beta = 4):
+    """
+    Bureau of Public Roads volume-delay function, t = t0 * (1 + alpha * (flow / capacity) ^ beta) + fixed.
+
+    Args:
+    - free_times (np.ndarray): The free flow time of each edge (in minutes)
+    - fixed_times (np.ndarray): The congestion and traffic light time of each edge, independent of the flow (in minutes)
+    - flows (np.ndarray): The vehicles per hour on each edge
+    - capacity (np.ndarray): The vehicles per hour each edge carries at free flow
+
+    Returns:
+    - An array of the travel time (float) of each edge (in minutes)
+    """
+
+    return free_times * (1 + alpha * (flows / capacity) ** beta) + fixed_times
+
+
+# Build the search engine once per worker process
+def init_worker(env):
+    """
+    Args:
+    - env (traffic_env): The environment, inherited without copying when the pool is forked
+    """
+
+    global worker_engine
+    if worker_engine is None or worker_engine.env is not env:
+        worker_engine = dijkstra.Dijkstra(env)
+
+
+# All-or-nothing assignment of a group of origins
+def assign_origins(task):
+    """
+    Sends the demand of every origin down its shortest paths under the given edge times.
+
+    Args:
+    - task (tuple): The list of (origin index, destination indexes, demands) and the edge times (list)
+
+    Returns:
+    - flows (np.ndarray): The vehicles per hour put on each edge
+    - starts (np.ndarray): The vehicles per hour starting their route on each edge
+    - shortest_time (float): The demand weighted shortest time of the origins
+    - unassigned (float): The demand without a route
+    """
+
+    origins, times = task
+    engine = worker_engine
+    engine.weight = times
+    engine.source_weight = engine.env.edge_tl_source.tolist()
+    engine.traffic_version = engine.env.traffic_version
+
+    flows = np.zeros(len(times))
+    starts = np.zeros(len(times))
+    edge_load = {}
+    start_load = {}
+    shortest_time = unassigned = 0
+    for source, targets, demands in origins:
+        costs = engine.shortest_paths(source, targets)
+        for target, demand, cost in zip(targets, demands, costs):
+            if cost == float('inf'):
+                unassigned += demand
+                continue
+            shortest_time += demand * cost
+            if target == source:
+                continue
+
+            # Walk the predecessor edges of the search back to the origin
+            current_node = target
+            while current_node != source:
+                edge = engine.predecessor[current_node]
+                edge_load[edge] = edge_load.get(edge, 0) + demand
+                current_node = engine.edge_from[edge]
+            start_load[edge] = start_load.get(edge, 0) + demand
+
+    if edge_load:
+        flows[list(edge_load)] = list(edge_load.values())
+        starts[list(start_load)] = list(start_load.values())
+    return flows, starts, shortest_time, unassigned
+
+
+# Frank-Wolfe user equilibrium
+def assign_traffic(env, origins, destinations, demand, max_iterations = 50, tolerance = 1e-4, processes = 1, lane_capacity = 1800, alpha = 0.15, beta = 4):
+    """
+    Assigns an origin/destination demand to the network so that no vehicle can switch to a faster route
+    (user equilibrium). Every iteration runs an all-or-nothing assignment on the current edge times,
+    spread across a process pool by origin, and moves the flows towards it with a line search on the
+    Beckmann objective. Edge times follow bpr_times on the free flow time of each edge at its own speed
+    limit, with the congestion and traffic light entry times of the environment as fixed delays. The traffic light time of an edge as the
+    first edge of a route is charged to the vehicles starting on it, as in the searches of the
+    environment, so it shapes the routes and the gap but not the congested times.
+
+    Args:
+    - env (traffic_env): The environment
+    - origins (list): The IDs of the origin nodes
+    - destinations (list): The IDs of the destination nodes
+    - demand (np.ndarray): The origins x destinations vehicles per hour
+    - max_iterations (int): The largest number of Frank-Wolfe iterations
+    - tolerance (float): The relative gap to stop at
+    - processes (int or None): The number of worker processes, None for the CPU count
+    - lane_capacity (float): The vehicles per hour of a lane
+    - alpha (float): The BPR alpha
+    - beta (float): The BPR beta
+
+    Returns:
+    - An assignment_result
+    """
+
+    demand = np.asarray(demand, dtype = np.float64).reshape(len(origins), len(destinations))
+    for node in list(origins) + list(destinations):
+        if node not in env.node_index:
+            sys.exit(f'Error: Invalid Node {node}!')
+    if (demand < 0).any():
+        sys.exit('Error: The demand must be non-negative!')
+
+    # Free flow time at the speed limit of each edge (in m/s), the travel_speed of the environment without one
+    edge_speed = np.where(env.graph.edge_speed > 0, env.graph.edge_speed, env.travel_speed / 3.6)
+    free_times = env.graph.edge_length / edge_speed / 60
+    fixed_times = env.edge_congestion + env.edge_tl_entry
+    source_times = env.edge_tl_source
+    capacity = np.maximum(env.graph.edge_lanes, 1) * lane_capacity
+    targets = [env.node_index[node] for node in destinations]
+
+    # Origins with demand, split in a few chunks per process
+    tasks = []
+    for row, node in enumerate(origins):
+        positive = np.flatnonzero(demand[row] > 0)
+        if positive.size:
+            tasks.append((env.node_index[node], [targets[column] for column in positive], demand[row, positive].tolist()))
+    processes = min(processes or mp.cpu_count(), max(len(tasks), 1))
+    num_chunks = processes * 4 if processes > 1 else 1
+    chunks = [tasks[start::num_chunks] for start in range(num_chunks) if tasks[start::num_chunks]]
+
+    def all_or_nothing(times, pool):
+        items = [(chunk, times.tolist()) for chunk in chunks]
+        results = pool.map(assign_origins, items) if pool else list(map(assign_origins, items))
+        return tuple(sum(result[index] for result in results) for index in range(4))
+
+    pool = mp.Pool(processes, initializer = init_worker, initargs = (env,)) if processes > 1 else None
+    init_worker(env)
+    try:
+        times = bpr_times(free_times, fixed_times, np.zeros(env.graph.num_edges), capacity, alpha, beta)
+        flows, starts, _, unassigned = all_or_nothing(times, pool)
+        gaps = []
+
+        for _ in range(max_iterations):
+            times = bpr_times(free_times, fixed_times, flows, capacity, alpha, beta)
+            target_flows, target_starts, shortest_time, _ = all_or_nothing(times, pool)
+
+            # Relative gap between the time travelled and the time of the shortest routes
+            total_time = float(flows @ times + starts @ source_times)
+            gaps.append((total_time - shortest_time) / total_time if total_time > 0 else 0.0)
+            if gaps[-1] <= tolerance:
+                break
+
+            # Bisection on the derivative of the Beckmann objective along the direction
+            direction = target_flows - flows
+            start_direction = target_starts - starts
+            source_slope = start_direction @ source_times
+            low, high = 0.0, 1.0
+            for _ in range(30):
+                step = (low + high) / 2
+                if direction @ bpr_times(free_times, fixed_times, flows + step * direction, capacity, alpha, beta) + source_slope > 0:
+                    high = step
+                else:
+                    low = step
+            step = (low + high) / 2
+            flows = flows + step * direction
+            starts = starts + step * start_direction
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    times = bpr_times(free_times, fixed_times, flows, capacity, alpha, beta)
+    return assignment_result(env, flows, times, free_times + fixed_times, gaps, unassigned)
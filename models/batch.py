@@ -0,0 +1,119 @@
+import io
+import json
+import time
+import contextlib
+import multiprocessing as mp
+
+import environment
+import dijkstra
+import contraction
+
+
+# Search classes by name
+ENGINES = {
+    'Dijkstra': dijkstra.Dijkstra,
+    'AStar': dijkstra.AStar,
+    'Bidirectional': dijkstra.Bidirectional,
+    'ContractionHierarchy': contraction.ContractionHierarchy,
+}
+
+# Per-process routing state, inherited from the parent on fork or loaded once by init_worker
+worker_env = None
+worker_engine = None
+
+
+# Load the environment once per worker process
+def init_worker(env_settings, algorithm = 'Dijkstra'):
+    """
+    Prepares the routing engine of a worker process. When the pool is forked the environment
+    and engine loaded by the parent are reused read-only, otherwise they are built from env_settings.
+
+    Args:
+    - env_settings (dict): The keyword arguments of traffic_env, with the traffic resolved by the parent
+    - algorithm (str): The search class, one of ENGINES
+    """
+
+    global worker_env, worker_engine
+    if worker_env is None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            worker_env = environment.traffic_env(**env_settings)
+    if worker_engine is None:
+        worker_engine = ENGINES[algorithm](worker_env)
+
+
+# Answer a single JSONL query line
+def route_query(line):
+    """
+    Routes one origin/destination query.
+
+    Args:
+    - line (str): A JSON object with 'start' and 'end' node IDs and an optional 'id'
+
+    Returns:
+    - A JSON result line (str) with the node path, edge path, cost and latency, or an error
+    """
+
+    start_time = time.perf_counter()
+    try:
+        query = json.loads(line)
+        start_node, end_node = str(query['start']), str(query['end'])
+    except (ValueError, KeyError, TypeError) as error:
+        return json.dumps({'error': f'Invalid query: {error}', 'query': line.strip()})
+
+    result = {'id': query.get('id'), 'start': start_node, 'end': end_node}
+    if start_node not in worker_env.node_index:
+        result['error'] = 'Invalid Start Node'
+    elif end_node not in worker_env.node_index:
+        result['error'] = 'Invalid End Node'
+    else:
+        node_path, edge_path, cost = worker_engine.query(start_node, end_node)
+        result['node_path'] = node_path
+        result['edge_path'] = edge_path
+        result['cost'] = None if cost == float('inf') else cost
+
+    result['latency_ms'] = (time.perf_counter() - start_time) * 1000
+    return json.dumps(result)
+
+
+# Route every query of a JSONL file
+def run_batch(env_settings, input_file, output_file, processes = None, chunksize = 64, algorithm = 'Dijkstra'):
+    """
+    Streams origin/destination queries from input_file, fans them out across a process pool
+    and writes the results to output_file in the order of the queries.
+
+    Args:
+    - env_settings (dict): The keyword arguments of traffic_env
+    - input_file (str): The JSONL file of queries
+    - output_file (str): The JSONL file to write the results to
+    - processes (int or None): The number of worker processes, defaults to the CPU count
+    - chunksize (int): The number of queries sent to a worker at a time
+    - algorithm (str): The search class, one of ENGINES
+
+    Returns:
+    - The number of queries answered (int)
+    """
+
+    global worker_env, worker_engine
+    worker_env = environment.traffic_env(**env_settings)
+    worker_engine = ENGINES[algorithm](worker_env)
+
+    # Workers that load their own environment get the parent's traffic instead of drawing new congestion
+    worker_settings = dict(env_settings, **worker_env.traffic_settings())
+    processes = processes or mp.cpu_count()
+    num_queries = 0
+
+    with open(input_file) as queries, open(output_file, 'w') as results:
+        lines = (line for line in queries if line.strip())
+
+        if processes == 1:
+            init_worker(worker_settings, algorithm)
+            for answer in map(route_query, lines):
+                results.write(answer + '\n')
+                num_queries += 1
+        else:
+            with mp.Pool(processes, initializer = init_worker, initargs = (worker_settings, algorithm)) as pool:
+                for answer in pool.imap(route_query, lines, chunksize):
+                    results.write(answer + '\n')
+                    num_queries += 1
+
+    return num_queries
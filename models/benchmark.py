@@ -0,0 +1,219 @@
+import io
+import time
+import random
+import platform
+import statistics
+import subprocess
+import contextlib
+
+import numpy as np
+import environment
+import agent
+import dijkstra
+
+
+# Bundled networks with the route and traffic lights of main.py
+NETWORKS = {
+    '2x3': {
+        'network_file': './network_files/2x3_network.net.xml',
+        'start_node': 'A',
+        'end_node': 'N',
+        'traffic_light': [("B", 5), ("I", 5), ("G", 5)],
+    },
+    'sunway': {
+        'network_file': './network_files/sunway_network.net.xml',
+        'start_node': '101',
+        'end_node': '105',
+        'traffic_light': [(["2124969573", "2124969571"], 5), (["677583896", "1670458823"], 5), (["2210133573", "2210133562", "2210133501", "2210133223"], 5), (["4123498067", "4123498068", "2210132568", "2210132847"], 5), (["1197884608", "1197880914", "1197884584", "269953766"], 5), (["5762726921", "8948947765", "10845806303", "10845816012"], 5), (["677583804", "677583801", "677583803", "677583802"], 5), (["7211376203", "7211376202", "7211376200", "7211376201"], 5), (["2747527085", "1636307448", "678457498", "5780613945", "5780613944"], 5), (["5727497437", "5727497436", "678457587", "678457535"], 5), (["463099148", "1197913517"], 5), ("712814465", 5), ("1197913486", 5), ("9209244285", 5)],
+    },
+}
+
+
+# Median wall time of a call
+def time_call(function, repeat):
+    """
+    Args:
+    - function (callable): The call to time, its output is discarded
+    - repeat (int): The number of timed calls
+
+    Returns:
+    - The median seconds (float) of a call
+    """
+
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings)
+
+
+# Build the environment of a benchmark
+def load_env(network, congestion_level, evaluation, seed):
+    # The random congestion of the level is drawn from the seeded random module
+    random.seed(seed)
+    settings = NETWORKS[network]
+    with contextlib.redirect_stdout(io.StringIO()):
+        return environment.traffic_env(settings['network_file'], traffic_light = settings['traffic_light'], evaluation = evaluation, congestion_level = congestion_level)
+
+
+# Routes between random node pairs
+def random_routes(env, num_routes, seed):
+    rng = np.random.default_rng(seed)
+    search = dijkstra.Dijkstra(env)
+    routes = []
+    while len(routes) < num_routes:
+        start_node, end_node = rng.choice(env.nodes, 2, replace = False)
+        _, edge_path, cost = search.query(start_node, end_node)
+        if edge_path:
+            routes.append(edge_path)
+    return routes
+
+
+# Steps per second of an agent's training
+def training_rate(env, agent_class, start_node, end_node, num_episodes, seed, repeat, batch_size = None):
+    """
+    Trains agent_class from a fixed seed, once counting its Q-table updates and then timed without
+    counting. The seed makes every run take the same steps. With a batch_size the agent trains with
+    train_batch and every row of a batched update counts as a step.
+
+    Returns:
+    - The median seconds (float) of a training run and the number of steps (int) it takes
+    """
+
+    def train(learn = None):
+        np.random.seed(seed)
+        trainer = agent_class(env, start_node, end_node)
+        if batch_size:
+            if learn:
+                trainer.learn_batch = learn(trainer.learn_batch)
+            trainer.train_batch(num_episodes, 5, batch_size, exit_on_failure = False)
+        else:
+            if learn:
+                trainer.learn = learn(trainer.learn)
+            trainer.train(num_episodes, 5, exit_on_failure = False)
+
+    steps = [0]
+    def counting(learn):
+        def wrapper(*args):
+            steps[0] += len(args[0]) if batch_size else 1
+            return learn(*args)
+        return wrapper
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        train(counting)
+    return time_call(train, repeat), steps[0]
+
+
+# Run every benchmark on one network and traffic
+def benchmark_network(network, congestion_level, evaluation = 't', seed = 0, repeat = 5, num_routes = 200, num_episodes = 500):
+    """
+    Args:
+    - network (str): The key of the network in NETWORKS
+    - congestion_level (str): low, medium or high
+    - evaluation (str): distance, d or time, t
+    - seed (int): The seed of the congestion, routes and training
+    - repeat (int): The number of timed runs, the median is kept
+    - num_routes (int): The number of random routes for get_edge_time
+    - num_episodes (int): The maximum number of training episodes
+
+    Returns:
+    - A list of result dictionaries with the benchmark name, median seconds and rate per second
+    """
+
+    settings = NETWORKS[network]
+    start_node, end_node = settings['start_node'], settings['end_node']
+    env = load_env(network, congestion_level, evaluation, seed)
+    results = []
+
+    def add(name, seconds, items = 1, unit = 'calls'):
+        results.append({
+            'network': network,
+            'congestion_level': congestion_level,
+            'evaluation': evaluation,
+            'benchmark': name,
+            'seconds': seconds,
+            'items': items,
+            'rate': items / seconds if seconds else float('inf'),
+            'unit': f'{unit}/s',
+        })
+
+    # Environment
+    add('traffic_env', time_call(lambda: load_env(network, congestion_level, evaluation, seed), repeat))
+    add('decode_edges_to_label', time_call(env.decode_edges_to_label, repeat))
+
+    # Routing
+    search = dijkstra.Dijkstra(env, start_node, end_node)
+    add('Dijkstra.search', time_call(search.search, repeat))
+
+    routes = random_routes(env, num_routes, seed)
+    add('get_edge_time', time_call(lambda: [env.get_edge_time(route) for route in routes], repeat), len(routes), 'routes')
+
+    # Training
+    for agent_class in (agent.Q_Learning, agent.SARSA):
+        seconds, steps = training_rate(env, agent_class, start_node, end_node, num_episodes, seed, repeat)
+        add(f'{agent_class.__name__}.train', seconds, steps, 'steps')
+        seconds, steps = training_rate(env, agent_class, start_node, end_node, num_episodes, seed, repeat, batch_size = 32)
+        add(f'{agent_class.__name__}.train_batch', seconds, steps, 'steps')
+
+    return results
+
+
+# Run the benchmarks of several networks and levels
+def run_benchmarks(networks, congestion_levels, evaluation = 't', seed = 0, repeat = 5):
+    """
+    Returns:
+    - A dictionary with the commit, platform, settings and the results of every benchmark
+    """
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    results = []
+    for network in networks:
+        for congestion_level in congestion_levels:
+            results += benchmark_network(network, congestion_level, evaluation, seed, repeat)
+
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'evaluation': evaluation,
+        'seed': seed,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+# Compare two benchmark runs
+def compare_results(baseline, current, tolerance = 0.2, min_seconds = 0.001):
+    """
+    Matches the results of two runs by network, congestion level, evaluation and benchmark. Benchmarks
+    faster than min_seconds in both runs are skipped, their timings are mostly timer and scheduling noise.
+
+    Args:
+    - baseline (dict): A run of run_benchmarks, e.g. of an earlier commit
+    - current (dict): The run to check
+    - tolerance (float): The allowed relative slowdown
+    - min_seconds (float): The shortest timing that is compared
+
+    Returns:
+    - A list of (key, baseline seconds, current seconds) of the benchmarks slower than the tolerance
+    """
+
+    def key(result):
+        return (result['network'], result['congestion_level'], result['evaluation'], result['benchmark'])
+
+    baseline_seconds = {key(result): result['seconds'] for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        previous = baseline_seconds.get(key(result))
+        if not previous or max(previous, result['seconds']) < min_seconds:
+            continue
+        if result['seconds'] > previous * (1 + tolerance):
+            regressions.append((key(result), previous, result['seconds']))
+    return regressions
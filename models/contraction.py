@@ -0,0 +1,450 @@
+import os
+import heapq
+import hashlib
+import numpy as np
+import graph
+import dijkstra
+
+
+# Bump when the cached arrays change so stale hierarchies are rebuilt
+CACHE_VERSION = 1
+
+
+class hierarchy_graph:
+    def __init__ (self, rank, arc_from, arc_to, arc_weight, arc_edge, arc_first, arc_second, up_offsets, up_arcs, down_offsets, down_arcs):
+        # Contraction order of every node
+        self.rank = np.asarray(rank, dtype = np.int32)
+
+        # Original edges and shortcuts, a shortcut (arc_edge == -1) is made of its first and second arcs
+        self.arc_from = np.asarray(arc_from, dtype = np.int32)
+        self.arc_to = np.asarray(arc_to, dtype = np.int32)
+        self.arc_weight = np.asarray(arc_weight, dtype = np.float64)
+        self.arc_edge = np.asarray(arc_edge, dtype = np.int32)
+        self.arc_first = np.asarray(arc_first, dtype = np.int32)
+        self.arc_second = np.asarray(arc_second, dtype = np.int32)
+
+        # CSR of the arcs leaving each node upward, and of the arcs entering each node from above
+        self.up_offsets = np.asarray(up_offsets, dtype = np.int64)
+        self.up_arcs = np.asarray(up_arcs, dtype = np.int32)
+        self.down_offsets = np.asarray(down_offsets, dtype = np.int64)
+        self.down_arcs = np.asarray(down_arcs, dtype = np.int32)
+
+
+    # Contract every node of a graph
+    @classmethod
+    def build(cls, network, weight, settle_limit = 64):
+        """
+        Contracts the nodes in order of edge difference plus contracted neighbours, with lazy updates.
+        A shortcut u -> w is added for a contracted node v unless a witness search from u, which never
+        passes through v, finds a path to w of at most the same cost.
+
+        Args:
+        - network (network_graph): The compiled graph
+        - weight (list): The cost (float) of each edge
+        - settle_limit (int): The number of nodes a witness search may settle, a cut off search only adds shortcuts
+
+        Returns:
+        - A hierarchy_graph
+        """
+
+        num_nodes = network.num_nodes
+        arc_from, arc_to, arc_weight, arc_edge, arc_first, arc_second = [], [], [], [], [], []
+        out_adj = [{} for _ in range(num_nodes)]
+        in_adj = [{} for _ in range(num_nodes)]
+
+        def add_arc(tail, head, cost, edge, first, second):
+            arc_from.append(tail)
+            arc_to.append(head)
+            arc_weight.append(cost)
+            arc_edge.append(edge)
+            arc_first.append(first)
+            arc_second.append(second)
+            out_adj[tail][head] = len(arc_weight) - 1
+            in_adj[head][tail] = len(arc_weight) - 1
+
+        # cheapest edge between each pair of nodes, loops are never on a shortest path
+        for edge, (tail, head) in enumerate(zip(network.edge_from.tolist(), network.edge_to.tolist())):
+            if tail != head and (head not in out_adj[tail] or weight[edge] < arc_weight[out_adj[tail][head]]):
+                add_arc(tail, head, weight[edge], edge, -1, -1)
+
+        def witness_costs(source, excluded, max_cost):
+            costs = {source: 0.0}
+            priority_queue = [(0.0, source)]
+            settled = 0
+            while priority_queue and settled < settle_limit:
+                current_cost, current_node = heapq.heappop(priority_queue)
+                if current_cost > costs[current_node]:
+                    continue
+                if current_cost > max_cost:
+                    break
+                settled += 1
+                for neigh_node, arc in out_adj[current_node].items():
+                    tentative_cost = current_cost + arc_weight[arc]
+                    if neigh_node != excluded and tentative_cost < costs.get(neigh_node, float('inf')):
+                        costs[neigh_node] = tentative_cost
+                        heapq.heappush(priority_queue, (tentative_cost, neigh_node))
+            return costs
+
+        def find_shortcuts(node):
+            shortcuts = []
+            if not in_adj[node] or not out_adj[node]:
+                return shortcuts
+            max_out = max(arc_weight[arc] for arc in out_adj[node].values())
+            for tail, in_arc in in_adj[node].items():
+                costs = witness_costs(tail, node, arc_weight[in_arc] + max_out)
+                for head, out_arc in out_adj[node].items():
+                    cost = arc_weight[in_arc] + arc_weight[out_arc]
+                    if head != tail and costs.get(head, float('inf')) > cost:
+                        shortcuts.append((tail, head, cost, in_arc, out_arc))
+            return shortcuts
+
+        contracted_neighbours = [0] * num_nodes
+        def priority(node, shortcuts):
+            return len(shortcuts) - len(in_adj[node]) - len(out_adj[node]) + contracted_neighbours[node]
+
+        pending = {node: find_shortcuts(node) for node in range(num_nodes)}
+        priority_queue = [(priority(node, pending[node]), node) for node in range(num_nodes)]
+        heapq.heapify(priority_queue)
+
+        rank = [0] * num_nodes
+        up_lists, down_lists = [None] * num_nodes, [None] * num_nodes
+        for order in range(num_nodes):
+            # lazy update, contract the node only if it is still the cheapest after recomputing
+            while True:
+                _, node = heapq.heappop(priority_queue)
+                pending[node] = find_shortcuts(node)
+                node_priority = priority(node, pending[node])
+                if not priority_queue or node_priority <= priority_queue[0][0]:
+                    break
+                heapq.heappush(priority_queue, (node_priority, node))
+
+            for tail, head, cost, in_arc, out_arc in pending.pop(node):
+                if head not in out_adj[tail] or cost < arc_weight[out_adj[tail][head]]:
+                    add_arc(tail, head, cost, -1, in_arc, out_arc)
+
+            # the arcs left on the node all lead to nodes contracted later
+            rank[node] = order
+            up_lists[node] = list(out_adj[node].values())
+            down_lists[node] = list(in_adj[node].values())
+            for tail in in_adj[node]:
+                del out_adj[tail][node]
+                contracted_neighbours[tail] += 1
+            for head in out_adj[node]:
+                del in_adj[head][node]
+                contracted_neighbours[head] += 1
+
+        up_offsets = np.zeros(num_nodes + 1, dtype = np.int64)
+        np.cumsum([len(arcs) for arcs in up_lists], out = up_offsets[1:])
+        down_offsets = np.zeros(num_nodes + 1, dtype = np.int64)
+        np.cumsum([len(arcs) for arcs in down_lists], out = down_offsets[1:])
+
+        return cls(
+            rank = rank,
+            arc_from = arc_from,
+            arc_to = arc_to,
+            arc_weight = arc_weight,
+            arc_edge = arc_edge,
+            arc_first = arc_first,
+            arc_second = arc_second,
+            up_offsets = up_offsets,
+            up_arcs = [arc for arcs in up_lists for arc in arcs],
+            down_offsets = down_offsets,
+            down_arcs = [arc for arcs in down_lists for arc in arcs],
+        )
+
+
+    # Write the hierarchy to a cache file
+    def save(self, cache_file, source_hash, weight_hash):
+        """
+        Stores the hierarchy as an uncompressed .npz file.
+
+        Args:
+        - cache_file (str): The path of the cache file
+        - source_hash (str): The hash of the network file
+        - weight_hash (str): The hash of the edge weights the hierarchy was built for
+        """
+
+        # write to a temporary file first so concurrent readers never see a partial cache
+        temp_file = f'{cache_file}.{os.getpid()}.tmp'
+        with open(temp_file, 'wb') as file:
+            np.savez(
+                file,
+                version = CACHE_VERSION,
+                source_hash = source_hash,
+                weight_hash = weight_hash,
+                rank = self.rank,
+                arc_from = self.arc_from,
+                arc_to = self.arc_to,
+                arc_weight = self.arc_weight,
+                arc_edge = self.arc_edge,
+                arc_first = self.arc_first,
+                arc_second = self.arc_second,
+                up_offsets = self.up_offsets,
+                up_arcs = self.up_arcs,
+                down_offsets = self.down_offsets,
+                down_arcs = self.down_arcs,
+            )
+        os.replace(temp_file, cache_file)
+
+
+    # Read the hierarchy from a cache file
+    @classmethod
+    def load(cls, cache_file, source_hash, weight_hash):
+        """
+        Loads a hierarchy written by save.
+
+        Args:
+        - cache_file (str): The path of the cache file
+        - source_hash (str): The expected hash of the network file
+        - weight_hash (str): The expected hash of the edge weights
+
+        Returns:
+        - A hierarchy_graph, or None if the cache is missing, outdated or unreadable
+        """
+
+        try:
+            with np.load(cache_file, allow_pickle = False) as data:
+                if int(data['version']) != CACHE_VERSION or str(data['source_hash']) != source_hash or str(data['weight_hash']) != weight_hash:
+                    return None
+                arrays = {key: data[key] for key in data.files if key not in ('version', 'source_hash', 'weight_hash')}
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(**arrays)
+
+
+# Hash of the edge weights
+def weight_hash(weight):
+    """
+    Args:
+    - weight (np.ndarray): The cost of each edge
+
+    Returns:
+    - The SHA-1 hex digest (str) of the weights
+    """
+
+    return hashlib.sha1(np.ascontiguousarray(weight, dtype = np.float64).tobytes()).hexdigest()
+
+
+# Load the hierarchy of a network and weights, from the cache when it is up to date
+def load_hierarchy(network_file, network, weight, mode, use_cache = True):
+    """
+    Returns the contraction hierarchy of the weights. The cache next to the network file is used
+    when it was built for the same network file and weights, otherwise it is rebuilt.
+
+    Args:
+    - network_file (str): The path of the .net.xml file
+    - network (network_graph): The compiled graph
+    - weight (np.ndarray): The cost of each edge
+    - mode (str): The kind of weights, e.g. 'd' or 't', each mode has its own cache file
+    - use_cache (bool): Whether to read and write the cache file
+
+    Returns:
+    - A hierarchy_graph
+    """
+
+    if not use_cache:
+        return hierarchy_graph.build(network, weight.tolist())
+
+    source_hash, edge_hash = graph.file_hash(network_file), weight_hash(weight)
+    cache_file = graph.cache_path(network_file, f'ch_{mode}')
+    hierarchy = hierarchy_graph.load(cache_file, source_hash, edge_hash)
+    if hierarchy is not None:
+        return hierarchy
+
+    hierarchy = hierarchy_graph.build(network, weight.tolist())
+    try:
+        hierarchy.save(cache_file, source_hash, edge_hash)
+    except OSError:
+        pass
+    return hierarchy
+
+
+class ContractionHierarchy(dijkstra.Dijkstra):
+    def __init__ (self, env, start_node = None, end_node = None, use_cache = True):
+        # Inherit the graph, weights and workspaces from Dijkstra, the hierarchy is loaded with the weights
+        self.use_cache = use_cache
+        super().__init__(env, start_node, end_node)
+
+        # Backward workspaces and the path of the last search
+        self.cost_back = [float('inf')] * self.env.graph.num_nodes
+        self.successor = [-1] * self.env.graph.num_nodes
+        self.cost_back_stamp = [0] * self.env.graph.num_nodes
+        self.edge_path = []
+
+
+    # Load the per-edge cost and the hierarchy built for it
+    def load_weights(self):
+        weight = self.env.get_edge_weights()
+        self.weight = weight.tolist()
+        self.source_weight = self.env.get_source_weights().tolist()
+        self.traffic_version = self.env.traffic_version
+
+        hierarchy = load_hierarchy(self.env.network_file, self.env.graph, weight, self.env.evaluation[0], self.use_cache)
+        self.hierarchy = hierarchy
+        self.arc_from = hierarchy.arc_from.tolist()
+        self.arc_to = hierarchy.arc_to.tolist()
+        self.arc_weight = hierarchy.arc_weight.tolist()
+        self.arc_edge = hierarchy.arc_edge.tolist()
+        self.arc_first = hierarchy.arc_first.tolist()
+        self.arc_second = hierarchy.arc_second.tolist()
+        self.up_offsets = hierarchy.up_offsets.tolist()
+        self.up_arcs = hierarchy.up_arcs.tolist()
+        self.down_offsets = hierarchy.down_offsets.tolist()
+        self.down_arcs = hierarchy.down_arcs.tolist()
+
+
+    # Search on integer node ids
+    def shortest_path(self, source, target):
+        """
+        Searches upward in the hierarchy from source and from target, alternating by the smaller queue key.
+        The cheapest node reached by both searches joins the path, whose shortcuts are then unpacked
+        into the original edges. When the first edge of a route has a source cost, the forward search
+        starts from the ends of the edges leaving source instead, each paying its first edge cost.
+
+        Args:
+        - source (int): The index of the starting node
+        - target (int): The index of the ending node
+
+        Returns:
+        - The cost (float) of the shortest path summed along its edges as Dijkstra does, inf if target is unreachable
+        """
+
+        # Pick up traffic updates of the environment, the hierarchy is rebuilt for the new weights
+        if self.traffic_version != self.env.traffic_version:
+            self.load_weights()
+
+        generation = self.reset()
+        cost, predecessor, cost_stamp = self.cost, self.predecessor, self.cost_stamp
+        cost_back, successor, cost_back_stamp = self.cost_back, self.successor, self.cost_back_stamp
+        arc_from, arc_to, arc_weight = self.arc_from, self.arc_to, self.arc_weight
+        up_offsets, up_arcs, down_offsets, down_arcs = self.up_offsets, self.up_arcs, self.down_offsets, self.down_arcs
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        if source == target:
+            self.expanded, self.edge_path = 1, []
+            return 0
+
+        # seeds of the forward search, an edge leaving source is marked in predecessor as -2 - edge
+        cost_back[target], successor[target], cost_back_stamp[target] = 0.0, -1, generation
+        source_edges = self.out_edges[self.out_offsets[source]:self.out_offsets[source+1]]
+        if any(self.source_weight[edge] for edge in source_edges):
+            forward_queue = []
+            for edge in source_edges:
+                neigh_node = self.edge_to[edge]
+                tentative_cost = self.weight[edge] + self.source_weight[edge]
+                if cost_stamp[neigh_node] != generation or tentative_cost < cost[neigh_node]:
+                    cost_stamp[neigh_node], cost[neigh_node], predecessor[neigh_node] = generation, tentative_cost, -2 - edge
+                    heappush(forward_queue, (tentative_cost, neigh_node))
+        else:
+            cost[source], predecessor[source], cost_stamp[source] = 0.0, -1, generation
+            forward_queue = [(0.0, source)]
+        backward_queue = [(0.0, target)]
+        best_cost, meeting_node = float('inf'), -1
+        expanded = 0
+
+        while forward_queue or backward_queue:
+            # each side stops once its queue cannot improve the best meeting point
+            if forward_queue and forward_queue[0][0] >= best_cost:
+                forward_queue = []
+            if backward_queue and backward_queue[0][0] >= best_cost:
+                backward_queue = []
+
+            if forward_queue and (not backward_queue or forward_queue[0][0] <= backward_queue[0][0]):
+                current_cost, current_node = heappop(forward_queue)
+                if current_cost > cost[current_node]:
+                    continue
+                expanded += 1
+                if cost_back_stamp[current_node] == generation and current_cost + cost_back[current_node] < best_cost:
+                    best_cost, meeting_node = current_cost + cost_back[current_node], current_node
+
+                for index in range(up_offsets[current_node], up_offsets[current_node+1]):
+                    arc = up_arcs[index]
+                    neigh_node = arc_to[arc]
+                    tentative_cost = current_cost + arc_weight[arc]
+                    if cost_stamp[neigh_node] != generation or tentative_cost < cost[neigh_node]:
+                        cost_stamp[neigh_node] = generation
+                        cost[neigh_node] = tentative_cost
+                        predecessor[neigh_node] = arc
+                        heappush(forward_queue, (tentative_cost, neigh_node))
+
+            elif backward_queue:
+                current_cost, current_node = heappop(backward_queue)
+                if current_cost > cost_back[current_node]:
+                    continue
+                expanded += 1
+                if cost_stamp[current_node] == generation and current_cost + cost[current_node] < best_cost:
+                    best_cost, meeting_node = current_cost + cost[current_node], current_node
+
+                for index in range(down_offsets[current_node], down_offsets[current_node+1]):
+                    arc = down_arcs[index]
+                    neigh_node = arc_from[arc]
+                    tentative_cost = current_cost + arc_weight[arc]
+                    if cost_back_stamp[neigh_node] != generation or tentative_cost < cost_back[neigh_node]:
+                        cost_back_stamp[neigh_node] = generation
+                        cost_back[neigh_node] = tentative_cost
+                        successor[neigh_node] = arc
+                        heappush(backward_queue, (tentative_cost, neigh_node))
+
+        self.expanded = expanded
+        if meeting_node < 0:
+            self.edge_path = []
+            return float('inf')
+
+        # Arcs from source up to the meeting node and from there down to target
+        arcs = []
+        current_node = meeting_node
+        while predecessor[current_node] >= 0:
+            arcs.append(predecessor[current_node])
+            current_node = arc_from[predecessor[current_node]]
+        arcs.reverse()
+        first_marker = predecessor[current_node]
+        current_node = meeting_node
+        while current_node != target:
+            arcs.append(successor[current_node])
+            current_node = arc_to[successor[current_node]]
+
+        self.edge_path = self.unpack(arcs)
+        if first_marker <= -2:
+            self.edge_path.insert(0, -2 - first_marker)
+
+        # sum in route order so the cost is the same as Dijkstra's
+        total_cost = self.weight[self.edge_path[0]] + self.source_weight[self.edge_path[0]]
+        for edge in self.edge_path[1:]:
+            total_cost += self.weight[edge]
+        return total_cost
+
+
+    # Replace shortcuts by the original edges
+    def unpack(self, arcs):
+        """
+        Args:
+        - arcs (list): Arc ids of a path in the hierarchy
+
+        Returns:
+        - A list of edge ids (int) of the same path
+        """
+
+        edge_path = []
+        stack = list(reversed(arcs))
+        while stack:
+            arc = stack.pop()
+            if self.arc_edge[arc] >= 0:
+                edge_path.append(self.arc_edge[arc])
+            else:
+                stack.append(self.arc_second[arc])
+                stack.append(self.arc_first[arc])
+        return edge_path
+
+
+    # Path of the last search
+    def reconstruct_path(self, source, target):
+        """
+        Args:
+        - source (int): The index of the starting node
+        - target (int): The index of the ending node
+
+        Returns:
+        - A list of edge ids (int) from source to target
+        """
+
+        return list(self.edge_path)
@@ -1,71 +1,248 @@
+import os, sys
+import json
 import heapq
+import hashlib
+import numpy as np
 import datetime
+import graph
 
 
 class Dijkstra:
-    def __init__ (self, env, start_node, end_node):
+    def __init__ (self, env, start_node = None, end_node = None):
         # Initialize environment
         self.env = env
-        self.env.set_start_end(start_node, end_node)
+        if start_node is not None or end_node is not None:
+            self.env.set_start_end(start_node, end_node)
+
+        # Graph as flat lists, indexing them is faster than NumPy inside the search loop
+        graph = self.env.graph
+        self.out_offsets = graph.out_offsets.tolist()
+        self.out_edges = graph.out_edges.tolist()
+        self.edge_from = graph.edge_from.tolist()
+        self.edge_to = graph.edge_to.tolist()
+        self.load_weights()
+
+        # Reusable workspaces, an entry is only valid when its stamp equals the current generation
+        self.cost = [float('inf')] * graph.num_nodes
+        self.predecessor = [-1] * graph.num_nodes
+        self.cost_stamp = [0] * graph.num_nodes
+        self.visited_stamp = [0] * graph.num_nodes
+        self.generation = 0
+        self.expanded = 0
+
+
+    # Load the per-edge cost of the evaluation method
+    def load_weights(self):
+        self.weight = self.env.get_edge_weights().tolist()
+        self.source_weight = self.env.get_source_weights().tolist()
+        self.traffic_version = self.env.traffic_version
 
 
     def reset(self):
-        # Initialize the distance and predecessor arrays.
-        self.cost = {node: float('inf') for node in self.env.nodes}
-        self.predecessor = {node: None for node in self.env.nodes}
-        self.cost[self.env.start_node] = 0
-        self.priority_queue = [(0, self.env.start_node)]
+        # Invalidate the cost, predecessor and visited arrays of the previous search.
+        self.generation += 1
+        self.expanded = 0
+        self.priority_queue = []
+        return self.generation
 
 
     def cost_funct(self, current_cost, neigh_edge):
-        if self.env.evaluation in ("distance", "d"):
-            cost = current_cost + self.env.get_edge_distance(neigh_edge)
-        else:
-            cost = current_cost + self.env.get_edge_time(neigh_edge)
-        return cost
+        return current_cost + self.weight[self.env.edge_index[neigh_edge]]
 
 
-    def search(self):
-        start_time = datetime.datetime.now()
-        self.reset()
+    # Settle the source and queue the ends of its edges
+    def expand_source(self, source, generation, estimate = None):
+        """
+        Starts a search from source. The first edge of a route also pays its source cost, a shortest
+        route never returns to source since that would pay the source's traffic lights again.
+
+        Args:
+        - source (int): The index of the starting node
+        - generation (int): The stamp of the current search
+        - estimate (list or None): The heuristic added to the queue keys
+        """
+
+        self.cost[source] = 0
+        self.predecessor[source] = -1
+        self.cost_stamp[source] = generation
+        self.visited_stamp[source] = generation
+
+        for index in range(self.out_offsets[source], self.out_offsets[source+1]):
+            neigh_edge = self.out_edges[index]
+            neigh_node = self.edge_to[neigh_edge]
+            tentative_cost = self.weight[neigh_edge] + self.source_weight[neigh_edge]
+
+            if self.cost_stamp[neigh_node] != generation or tentative_cost < self.cost[neigh_node]:
+                self.cost_stamp[neigh_node] = generation
+                self.cost[neigh_node] = tentative_cost
+                self.predecessor[neigh_node] = neigh_edge
+                heapq.heappush(self.priority_queue, (tentative_cost + (estimate[neigh_node] if estimate else 0), neigh_node))
+
+
+    # Search on integer node ids
+    def shortest_path(self, source, target):
+        """
+        Runs Dijkstra from source and stops once target is settled.
+
+        Args:
+        - source (int): The index of the starting node
+        - target (int): The index of the ending node
+
+        Returns:
+        - The cost (float) of the shortest path, inf if target is unreachable
+        """
 
-        while self.priority_queue:
-            current_cost, current_node = heapq.heappop(self.priority_queue)
+        # Pick up traffic updates of the environment, the graph and workspaces are kept
+        if self.traffic_version != self.env.traffic_version:
+            self.load_weights()
+
+        generation = self.reset()
+        cost, predecessor = self.cost, self.predecessor
+        cost_stamp, visited_stamp = self.cost_stamp, self.visited_stamp
+        out_offsets, out_edges, edge_to, weight = self.out_offsets, self.out_edges, self.edge_to, self.weight
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        if source == target:
+            self.expanded = 1
+            return 0
+
+        self.expand_source(source, generation)
+        priority_queue = self.priority_queue
+        expanded = 1
+
+        while priority_queue:
+            current_cost, current_node = heappop(priority_queue)
+            if visited_stamp[current_node] == generation:
+                continue
+            visited_stamp[current_node] = generation
+            expanded += 1
 
             # If the node is the end node, then stop searching.
-            if current_node == self.env.end_node:
-                break
+            if current_node == target:
+                self.expanded = expanded
+                return current_cost
 
             # Explore the neighbors nodes
-            for neigh_edge in self.env.decode_node_to_edges(current_node, direction = 'outgoing'):
-                neigh_node = self.env.decode_edge_to_node(neigh_edge, direction = 'end')
-                
-                # Calculate the cost of the neighbor.
-                tentative_cost = self.cost_funct(current_cost, neigh_edge)
-
-                # If the tentative distance is less than the current distance of the neighbor:
-                if tentative_cost < self.cost[neigh_node]:
-                    # Update the distance of the neighbor.
-                    self.cost[neigh_node] = tentative_cost
-                    
-                    # Update the predecessor of the neighbor.
-                    self.predecessor[neigh_node] = current_node
-                    
-                    # Add the neighbor to the priority queue.
-                    heapq.heappush(self.priority_queue, (tentative_cost, neigh_node))
-                
-        # Construct the path from the start node to the goal node.
-        node_path = []
+            for index in range(out_offsets[current_node], out_offsets[current_node+1]):
+                neigh_edge = out_edges[index]
+                neigh_node = edge_to[neigh_edge]
+                tentative_cost = current_cost + weight[neigh_edge]
+
+                if cost_stamp[neigh_node] != generation or tentative_cost < cost[neigh_node]:
+                    cost_stamp[neigh_node] = generation
+                    cost[neigh_node] = tentative_cost
+                    predecessor[neigh_node] = neigh_edge
+                    heappush(priority_queue, (tentative_cost, neigh_node))
+
+        self.expanded = expanded
+        return float('inf')
+
+
+    # Search from one node to many
+    def shortest_paths(self, source, targets):
+        """
+        Runs a single Dijkstra from source and stops once every target is settled,
+        the path to each target can then be read with reconstruct_path.
+
+        Args:
+        - source (int): The index of the starting node
+        - targets (list): The indexes of the ending nodes
+
+        Returns:
+        - A list of costs (float) of the shortest paths to each target, inf if unreachable
+        """
+
+        # Pick up traffic updates of the environment, the graph and workspaces are kept
+        if self.traffic_version != self.env.traffic_version:
+            self.load_weights()
+
+        generation = self.reset()
+        cost, predecessor = self.cost, self.predecessor
+        cost_stamp, visited_stamp = self.cost_stamp, self.visited_stamp
+        out_offsets, out_edges, edge_to, weight = self.out_offsets, self.out_edges, self.edge_to, self.weight
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        self.expand_source(source, generation)
+        priority_queue = self.priority_queue
+        remaining = set(targets) - {source}
+        expanded = 1
+
+        while priority_queue and remaining:
+            current_cost, current_node = heappop(priority_queue)
+            if visited_stamp[current_node] == generation:
+                continue
+            visited_stamp[current_node] = generation
+            expanded += 1
+            remaining.discard(current_node)
+
+            # Explore the neighbors nodes
+            for index in range(out_offsets[current_node], out_offsets[current_node+1]):
+                neigh_edge = out_edges[index]
+                neigh_node = edge_to[neigh_edge]
+                tentative_cost = current_cost + weight[neigh_edge]
+
+                if cost_stamp[neigh_node] != generation or tentative_cost < cost[neigh_node]:
+                    cost_stamp[neigh_node] = generation
+                    cost[neigh_node] = tentative_cost
+                    predecessor[neigh_node] = neigh_edge
+                    heappush(priority_queue, (tentative_cost, neigh_node))
+
+        self.expanded = expanded
+        return [cost[target] if visited_stamp[target] == generation else float('inf') for target in targets]
+
+
+    # Rebuild the edge path from the predecessor edges
+    def reconstruct_path(self, source, target):
+        """
+        Follows the predecessor edges of the last search back from target.
+
+        Args:
+        - source (int): The index of the starting node
+        - target (int): The index of the ending node
+
+        Returns:
+        - A list of edge ids (int) from source to target
+        """
+
         edge_path = []
-        current_node = self.env.end_node
-        while current_node is not None:
-            node_path.append(current_node)
-            current_node = self.predecessor[current_node]
-        node_path.reverse()
+        current_node = target
+        while current_node != source:
+            edge = self.predecessor[current_node]
+            edge_path.append(edge)
+            current_node = self.edge_from[edge]
+        edge_path.reverse()
+        return edge_path
 
-        for index in range(len(node_path)-1):
-            edge = set(self.env.decode_node_to_edges(node_path[index], "outgoing")) & set(self.env.decode_node_to_edges(node_path[index+1], "incoming"))
-            edge_path.append(next(iter(edge)))
+
+    # Search between two node IDs
+    def query(self, start_node, end_node):
+        """
+        Computes the shortest path between two nodes without printing.
+
+        Args:
+        - start_node (str): The ID of the starting node
+        - end_node (str): The ID of the ending node
+
+        Returns:
+        - node_path (list): The nodes (str) of the path, empty if unreachable
+        - edge_path (list): The edges (str) of the path, empty if unreachable
+        - cost (float): The cost of the path, inf if unreachable
+        """
+
+        source = self.env.node_index[start_node]
+        target = self.env.node_index[end_node]
+        cost = self.shortest_path(source, target)
+        if cost == float('inf'):
+            return [], [], cost
+
+        edge_path = self.reconstruct_path(source, target)
+        node_path = [self.env.nodes[source]] + [self.env.nodes[self.edge_to[edge]] for edge in edge_path]
+        return node_path, [self.env.edges[edge] for edge in edge_path], cost
+
+
+    def search(self):
+        start_time = datetime.datetime.now()
+        node_path, edge_path, _ = self.query(self.env.start_node, self.env.end_node)
 
         # time the search process
         end_time = datetime.datetime.now()
@@ -76,10 +253,996 @@ class Dijkstra:
         print('Search Completed...')
         print(f'-- States: {node_path} \n-- Edges: {edge_path}')
         print(f'-- Processing Time: {processing_seconds} seconds')
-        
+        print(f'-- Nodes Expanded: {self.expanded} of {self.env.graph.num_nodes}')
+
         if self.env.evaluation in ("distance", "d"):
             print(f'-- Distance travelled: {round(self.env.get_edge_distance(edge_path), 2)} m')
         else:
-            print(f'-- Travelled Time taken: {round(self.env.get_edge_time(edge_path), 2)} mins')
+            print(f'-- Travelled Time taken: {round(self.route_time(edge_path), 2)} mins')
+
+        return node_path, edge_path
+
+
+    # Time taken by a route found by the search
+    def route_time(self, edge_path):
+        return self.env.get_edge_time(edge_path)
+
+
+class AStar(Dijkstra):
+    def __init__ (self, env, start_node = None, end_node = None, num_landmarks = 8):
+        # Inherit the graph, weights and workspaces from Dijkstra
+        super().__init__(env, start_node, end_node)
+
+        # Lower bound of the cost per metre, time weights are never below the free flow time
+        graph = self.env.graph
+        if self.env.evaluation in ("distance", "d"):
+            self.unit_cost = 1.0
+        else:
+            self.unit_cost = 60 / (1000 * self.env.travel_speed)
+        self.length = graph.edge_length.tolist()
+        self.build_landmarks(num_landmarks)
+
+
+    # Distance lower bounds from the coordinates and a few landmarks
+    def build_landmarks(self, num_landmarks):
+        """
+        Prepares the admissible heuristic. The straight-line distance is scaled by the smallest ratio of
+        edge length to node distance, so it never overestimates. Short internal junction edges make that
+        ratio small on real networks, so the exact road distances from and to landmarks spread across
+        the network by their coordinates are used as a second lower bound (triangle inequality).
+
+        Args:
+        - num_landmarks (int): The number of landmarks, 0 uses the straight-line bound only
+
+        Sets:
+        - euclid_scale (float): The metres of road per metre of straight line lower bound
+        - landmarks (list): The landmark node indexes
+        - landmark_from (np.ndarray): Road distance from each landmark to each node
+        - landmark_to (np.ndarray): Road distance from each node to each landmark
+        """
+
+        graph = self.env.graph
+        straight = np.hypot(graph.node_x[graph.edge_to] - graph.node_x[graph.edge_from], graph.node_y[graph.edge_to] - graph.node_y[graph.edge_from])
+        ratio = graph.edge_length[straight > 0] / straight[straight > 0]
+        self.euclid_scale = float(min(ratio.min(), 1.0)) if ratio.size else 1.0
+
+        # farthest point selection by coordinates among the connected nodes
+        self.landmarks = []
+        candidates = np.flatnonzero((graph.out_degree > 0) & (graph.in_degree > 0))
+        if num_landmarks and candidates.size:
+            x, y = graph.node_x[candidates], graph.node_y[candidates]
+            nearest = np.hypot(x - x.mean(), y - y.mean())
+            for _ in range(min(num_landmarks, candidates.size)):
+                pick = int(np.argmax(nearest))
+                self.landmarks.append(int(candidates[pick]))
+                nearest = np.minimum(nearest, np.hypot(x - x[pick], y - y[pick]))
+
+        forward = (graph.out_offsets.tolist(), graph.out_edges.tolist(), self.edge_to)
+        backward = (graph.in_offsets.tolist(), graph.in_edges.tolist(), self.edge_from)
+        self.landmark_from = np.array([self.tree_lengths(landmark, *forward) for landmark in self.landmarks]).reshape(-1, graph.num_nodes)
+        self.landmark_to = np.array([self.tree_lengths(landmark, *backward) for landmark in self.landmarks]).reshape(-1, graph.num_nodes)
+
+
+    # Road distance from a node to every node
+    def tree_lengths(self, source, offsets, edges, edge_head):
+        """
+        Runs a full Dijkstra on the edge lengths.
+
+        Args:
+        - source (int): The index of the root node
+        - offsets (list): CSR offsets of the adjacency to follow
+        - edges (list): CSR edge ids of the adjacency to follow
+        - edge_head (list): The node each edge leads to in that direction
+
+        Returns:
+        - A list of distances (float) indexed by node, inf if unreachable
+        """
+
+        length = self.length
+        distance = [float('inf')] * len(offsets[:-1])
+        distance[source] = 0.0
+        priority_queue = [(0.0, source)]
+        while priority_queue:
+            current_cost, current_node = heapq.heappop(priority_queue)
+            if current_cost > distance[current_node]:
+                continue
+            for index in range(offsets[current_node], offsets[current_node+1]):
+                edge = edges[index]
+                neigh_node = edge_head[edge]
+                tentative_cost = current_cost + length[edge]
+                if tentative_cost < distance[neigh_node]:
+                    distance[neigh_node] = tentative_cost
+                    heapq.heappush(priority_queue, (tentative_cost, neigh_node))
+        return distance
+
+
+    # Lower bound of the cost between every node and a node
+    def heuristic(self, node, towards = True):
+        """
+        Computes the admissible and consistent heuristic of every node.
+
+        Args:
+        - node (int): The index of the node
+        - towards (bool): Lower bounds the cost from every node to node, otherwise from node to every node
+
+        Returns:
+        - A list of lower bounds (float) indexed by node
+        """
+
+        graph = self.env.graph
+        bound = self.euclid_scale * np.hypot(graph.node_x - graph.node_x[node], graph.node_y - graph.node_y[node])
+
+        if self.landmarks:
+            with np.errstate(invalid = 'ignore'):
+                if towards:
+                    # d(v, t) >= d(L, t) - d(L, v) and d(v, t) >= d(v, L) - d(t, L)
+                    candidates = np.concatenate([self.landmark_from[:, [node]] - self.landmark_from, self.landmark_to - self.landmark_to[:, [node]]])
+                else:
+                    # d(s, v) >= d(L, v) - d(L, s) and d(s, v) >= d(s, L) - d(v, L)
+                    candidates = np.concatenate([self.landmark_from - self.landmark_from[:, [node]], self.landmark_to[:, [node]] - self.landmark_to])
+            # terms with an unreachable landmark give no bound
+            candidates[~np.isfinite(candidates)] = 0
+            bound = np.maximum(bound, candidates.max(axis = 0))
+
+        return (bound * self.unit_cost).tolist()
+
+
+    # Search on integer node ids
+    def shortest_path(self, source, target):
+        """
+        Runs A* from source and stops once target is settled.
+
+        Args:
+        - source (int): The index of the starting node
+        - target (int): The index of the ending node
+
+        Returns:
+        - The cost (float) of the shortest path, inf if target is unreachable
+        """
+
+        # Pick up traffic updates of the environment, the graph and workspaces are kept
+        if self.traffic_version != self.env.traffic_version:
+            self.load_weights()
+
+        generation = self.reset()
+        cost, predecessor = self.cost, self.predecessor
+        cost_stamp, visited_stamp = self.cost_stamp, self.visited_stamp
+        out_offsets, out_edges, edge_to, weight = self.out_offsets, self.out_edges, self.edge_to, self.weight
+        heappush, heappop = heapq.heappush, heapq.heappop
+        estimate = self.heuristic(target)
+
+        if source == target:
+            self.expanded = 1
+            return 0
+
+        self.expand_source(source, generation, estimate)
+        priority_queue = self.priority_queue
+        expanded = 1
+
+        while priority_queue:
+            _, current_node = heappop(priority_queue)
+            if visited_stamp[current_node] == generation:
+                continue
+            visited_stamp[current_node] = generation
+            expanded += 1
+            current_cost = cost[current_node]
+
+            # If the node is the end node, then stop searching.
+            if current_node == target:
+                self.expanded = expanded
+                return current_cost
+
+            # Explore the neighbors nodes
+            for index in range(out_offsets[current_node], out_offsets[current_node+1]):
+                neigh_edge = out_edges[index]
+                neigh_node = edge_to[neigh_edge]
+                tentative_cost = current_cost + weight[neigh_edge]
+
+                if cost_stamp[neigh_node] != generation or tentative_cost < cost[neigh_node]:
+                    cost_stamp[neigh_node] = generation
+                    cost[neigh_node] = tentative_cost
+                    predecessor[neigh_node] = neigh_edge
+                    heappush(priority_queue, (tentative_cost + estimate[neigh_node], neigh_node))
+
+        self.expanded = expanded
+        return float('inf')
+
+
+class Bidirectional(AStar):
+    def __init__ (self, env, start_node = None, end_node = None, use_heuristic = True, num_landmarks = 8):
+        # Inherit the graph, weights, heuristic and forward workspaces from AStar
+        self.use_heuristic = use_heuristic
+        super().__init__(env, start_node, end_node, num_landmarks if use_heuristic else 0)
+
+        # Reverse adjacency and the backward workspaces
+        graph = self.env.graph
+        self.in_offsets = graph.in_offsets.tolist()
+        self.in_edges = graph.in_edges.tolist()
+        self.cost_back = [float('inf')] * graph.num_nodes
+        self.successor = [-1] * graph.num_nodes
+        self.cost_back_stamp = [0] * graph.num_nodes
+        self.visited_back_stamp = [0] * graph.num_nodes
+        self.meeting_node = -1
+
+
+    # Search on integer node ids
+    def shortest_path(self, source, target):
+        """
+        Searches forward from source and backward from target at the same time, expanding the side with
+        the smaller queue key, until the two frontiers can no longer improve the best meeting point.
+        With use_heuristic both sides use the average of the forward and backward heuristics, which keeps
+        the two searches consistent with each other.
+
+        Args:
+        - source (int): The index of the starting node
+        - target (int): The index of the ending node
+
+        Returns:
+        - The cost (float) of the shortest path, inf if target is unreachable
+        """
+
+        # Pick up traffic updates of the environment, the graph and workspaces are kept
+        if self.traffic_version != self.env.traffic_version:
+            self.load_weights()
+
+        generation = self.reset()
+        cost, predecessor, cost_stamp, visited_stamp = self.cost, self.predecessor, self.cost_stamp, self.visited_stamp
+        cost_back, successor, cost_back_stamp, visited_back_stamp = self.cost_back, self.successor, self.cost_back_stamp, self.visited_back_stamp
+        out_offsets, out_edges, in_offsets, in_edges = self.out_offsets, self.out_edges, self.in_offsets, self.in_edges
+        edge_from, edge_to, weight, source_weight = self.edge_from, self.edge_to, self.weight, self.source_weight
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        if source == target:
+            self.expanded, self.meeting_node = 1, source
+            return 0
+
+        # forward potential, the backward potential is its negative
+        if self.use_heuristic:
+            to_target, from_source = self.heuristic(target), self.heuristic(source, towards = False)
+            potential = [(forward - backward) / 2 for forward, backward in zip(to_target, from_source)]
+        else:
+            potential = [0.0] * len(cost)
+
+        # the edges leaving source also pay their source cost in both directions
+        cost_back[target], successor[target], cost_back_stamp[target] = 0, -1, generation
+        self.expand_source(source, generation, potential)
+        forward_queue = self.priority_queue
+        backward_queue = [(-potential[target], target)]
+        best_cost, self.meeting_node = float('inf'), -1
+        if cost_stamp[target] == generation:
+            best_cost, self.meeting_node = cost[target], target
+        expanded = 1
+
+        while forward_queue and backward_queue:
+            # Stop once no meeting point through the frontiers can be shorter
+            if forward_queue[0][0] + backward_queue[0][0] >= best_cost:
+                break
+
+            if forward_queue[0][0] <= backward_queue[0][0]:
+                _, current_node = heappop(forward_queue)
+                if visited_stamp[current_node] == generation:
+                    continue
+                visited_stamp[current_node] = generation
+                expanded += 1
+                current_cost = cost[current_node]
+
+                for index in range(out_offsets[current_node], out_offsets[current_node+1]):
+                    neigh_edge = out_edges[index]
+                    neigh_node = edge_to[neigh_edge]
+                    tentative_cost = current_cost + weight[neigh_edge]
+
+                    if cost_stamp[neigh_node] != generation or tentative_cost < cost[neigh_node]:
+                        cost_stamp[neigh_node] = generation
+                        cost[neigh_node] = tentative_cost
+                        predecessor[neigh_node] = neigh_edge
+                        heappush(forward_queue, (tentative_cost + potential[neigh_node], neigh_node))
+
+                        # Meeting the backward search
+                        if cost_back_stamp[neigh_node] == generation and tentative_cost + cost_back[neigh_node] < best_cost:
+                            best_cost, self.meeting_node = tentative_cost + cost_back[neigh_node], neigh_node
+            else:
+                _, current_node = heappop(backward_queue)
+                if visited_back_stamp[current_node] == generation:
+                    continue
+                visited_back_stamp[current_node] = generation
+                expanded += 1
+                current_cost = cost_back[current_node]
+
+                for index in range(in_offsets[current_node], in_offsets[current_node+1]):
+                    neigh_edge = in_edges[index]
+                    neigh_node = edge_from[neigh_edge]
+                    tentative_cost = current_cost + weight[neigh_edge]
+                    if neigh_node == source:
+                        tentative_cost += source_weight[neigh_edge]
+
+                    if cost_back_stamp[neigh_node] != generation or tentative_cost < cost_back[neigh_node]:
+                        cost_back_stamp[neigh_node] = generation
+                        cost_back[neigh_node] = tentative_cost
+                        successor[neigh_node] = neigh_edge
+                        heappush(backward_queue, (tentative_cost - potential[neigh_node], neigh_node))
+
+                        # Meeting the forward search
+                        if cost_stamp[neigh_node] == generation and tentative_cost + cost[neigh_node] < best_cost:
+                            best_cost, self.meeting_node = tentative_cost + cost[neigh_node], neigh_node
+
+        self.expanded = expanded
+        return best_cost
+
+
+    # Rebuild the edge path from both searches
+    def reconstruct_path(self, source, target):
+        """
+        Joins the predecessor edges from source to the meeting node with the successor edges
+        from the meeting node to target.
+
+        Args:
+        - source (int): The index of the starting node
+        - target (int): The index of the ending node
+
+        Returns:
+        - A list of edge ids (int) from source to target
+        """
+
+        edge_path = super().reconstruct_path(source, self.meeting_node)
+        current_node = self.meeting_node
+        while current_node != target:
+            edge = self.successor[current_node]
+            edge_path.append(edge)
+            current_node = self.edge_to[edge]
+        return edge_path
+
+
+class TimeDependent(AStar):
+    def __init__ (self, env, start_node = None, end_node = None, departure_time = 0, use_heuristic = True, num_landmarks = 8):
+        # Congestion profiles only apply to the time evaluation
+        if env.evaluation not in ("time", "t"):
+            sys.exit('Error: Time-dependent search needs the time evaluation!')
+
+        # Inherit the graph, weights, heuristic and workspaces from AStar
+        self.departure_time = departure_time
+        self.use_heuristic = use_heuristic
+        super().__init__(env, start_node, end_node, num_landmarks if use_heuristic else 0)
+
+
+    # Load the per-edge cost and the congestion profiles
+    def load_weights(self):
+        super().load_weights()
+        self.edge_profile = self.env.edge_profile.tolist()
+        self.profile_penalty = self.env.profile_penalty.tolist()
+        self.profile_slope = self.env.profile_slope.tolist()
+        self.profile_interval = self.env.profile_interval
+
+
+    # Search between two node IDs at a departure time
+    def query(self, start_node, end_node, departure_time = None):
+        """
+        Computes the fastest path between two nodes leaving at departure_time.
+
+        Args:
+        - start_node (str): The ID of the starting node
+        - end_node (str): The ID of the ending node
+        - departure_time (float or None): The time of leaving (in minutes since midnight), None keeps the last one
+
+        Returns:
+        - node_path (list): The nodes (str) of the path, empty if unreachable
+        - edge_path (list): The edges (str) of the path, empty if unreachable
+        - cost (float): The travel time of the path (in minutes), inf if unreachable
+        """
+
+        if departure_time is not None:
+            self.departure_time = departure_time
+        return super().query(start_node, end_node)
+
+
+    # Search on integer node ids
+    def shortest_path(self, source, target):
+        """
+        Runs time-dependent A* from source, leaving at departure_time. Every edge costs its static time
+        plus its congestion profile at the time it is entered. The profiles are FIFO, so settling nodes
+        in order of arrival time stays exact, and as they only add time the static heuristic stays admissible.
+
+        Args:
+        - source (int): The index of the starting node
+        - target (int): The index of the ending node
+
+        Returns:
+        - The travel time (float) of the fastest path, inf if target is unreachable
+        """
+
+        # Pick up traffic updates of the environment, the graph and workspaces are kept
+        if self.traffic_version != self.env.traffic_version:
+            self.load_weights()
+
+        generation = self.reset()
+        cost, predecessor = self.cost, self.predecessor
+        cost_stamp, visited_stamp = self.cost_stamp, self.visited_stamp
+        out_offsets, out_edges, edge_to, weight = self.out_offsets, self.out_edges, self.edge_to, self.weight
+        edge_profile, profile_penalty, profile_slope, interval = self.edge_profile, self.profile_penalty, self.profile_slope, self.profile_interval
+        last_sample = len(profile_penalty[0]) - 1 if profile_penalty else 0
+        heappush, heappop = heapq.heappush, heapq.heappop
+        estimate = self.heuristic(target) if self.use_heuristic else [0] * len(cost)
+        departure_time = self.departure_time
+
+        if source == target:
+            self.expanded = 1
+            return 0
+
+        cost[source] = 0
+        predecessor[source] = -1
+        cost_stamp[source] = generation
+        priority_queue = [(estimate[source], source)]
+        expanded = 0
+
+        while priority_queue:
+            _, current_node = heappop(priority_queue)
+            if visited_stamp[current_node] == generation:
+                continue
+            visited_stamp[current_node] = generation
+            expanded += 1
+            current_cost = cost[current_node]
+
+            # If the node is the end node, then stop searching.
+            if current_node == target:
+                self.expanded = expanded
+                return current_cost
+
+            # Time of day the edges of the node are entered
+            offset = (departure_time + current_cost) % 1440
+            sample = min(int(offset // interval), last_sample)
+            within = offset - sample * interval
+
+            # Explore the neighbors nodes, the source is never returned to
+            for index in range(out_offsets[current_node], out_offsets[current_node+1]):
+                neigh_edge = out_edges[index]
+                neigh_node = edge_to[neigh_edge]
+                if neigh_node == source:
+                    continue
+
+                tentative_cost = current_cost + weight[neigh_edge]
+                if current_node == source:
+                    tentative_cost += self.source_weight[neigh_edge]
+                row = edge_profile[neigh_edge]
+                if row >= 0:
+                    tentative_cost += profile_penalty[row][sample] + profile_slope[row][sample] * within
+
+                if cost_stamp[neigh_node] != generation or tentative_cost < cost[neigh_node]:
+                    cost_stamp[neigh_node] = generation
+                    cost[neigh_node] = tentative_cost
+                    predecessor[neigh_node] = neigh_edge
+                    heappush(priority_queue, (tentative_cost + estimate[neigh_node], neigh_node))
+
+        self.expanded = expanded
+        return float('inf')
+
+
+    # Time taken by a route found by the search
+    def route_time(self, edge_path):
+        return self.env.get_edge_time_at(edge_path, self.departure_time)
+
+
+class DestinationTrees:
+    def __init__ (self, env, destinations, use_cache = True):
+        """
+        Keeps one reverse shortest path tree per destination, so the next edge and the remaining cost
+        of any node are a single array lookup. The trees are built by a Dijkstra over the incoming edges
+        of every node, cached next to the network file and repaired for the changed edges only when the
+        traffic of the environment changes.
+
+        Args:
+        - env (traffic_env): The environment
+        - destinations (list): The IDs of the destination nodes
+        - use_cache (bool): Whether to read and write the cache file
+        """
+
+        self.env = env
+        self.destinations = list(destinations)
+        for node in self.destinations:
+            if node not in env.node_index:
+                sys.exit(f'Error: Invalid Node {node}!')
+        self.row = {node: row for row, node in enumerate(self.destinations)}
+        self.targets = [env.node_index[node] for node in self.destinations]
+
+        # Graph as flat lists, the incoming edges are the CSR form of decode_node_to_edges(node, 'incoming')
+        self.in_offsets = env.graph.in_offsets.tolist()
+        self.in_edges = env.graph.in_edges.tolist()
+        self.out_offsets = env.graph.out_offsets.tolist()
+        self.out_edges = env.graph.out_edges.tolist()
+        self.edge_from = env.graph.edge_from.tolist()
+        self.edge_to = env.graph.edge_to.tolist()
+
+        # The cache holds the costs the trees were built with, so it is repaired rather than rebuilt after traffic changes
+        self.cache_file = None
+        if use_cache:
+            digest = hashlib.sha1()
+            digest.update(graph.file_hash(env.network_file).encode())
+            digest.update(json.dumps([env.evaluation, self.destinations]).encode())
+            self.key = digest.hexdigest()
+            self.cache_file = graph.cache_path(env.network_file, f'trees_{self.key[:16]}')
+
+        if not self.load():
+            self.build()
+
+
+    # Build every tree from scratch
+    def build(self):
+        """
+        Sets:
+        - weight (np.ndarray): The edge costs the trees were built with
+        - source_weight (np.ndarray): The extra cost of each edge as the first edge of a route
+        - next_edge (np.ndarray): Destination x node edge id to take after arriving at a node, -1 at the destination or if unreachable
+        - cost_to_go (np.ndarray): Destination x node remaining cost after arriving at a node, inf if unreachable
+        - start_edge (np.ndarray): Destination x node first edge id of a route starting at a node
+        - start_cost (np.ndarray): Destination x node cost of a route starting at a node
+        """
+
+        self.weight = self.env.get_edge_weights()
+        self.source_weight = self.env.get_source_weights()
+        self.traffic_version = self.env.traffic_version
+        num_nodes = self.env.graph.num_nodes
+
+        self.next_edge = np.full((len(self.targets), num_nodes), -1, dtype = np.int32)
+        self.cost_to_go = np.full((len(self.targets), num_nodes), np.inf)
+        weight = self.weight.tolist()
+        for row, target in enumerate(self.targets):
+            next_edge, cost_to_go = [-1] * num_nodes, [float('inf')] * num_nodes
+            cost_to_go[target] = 0
+            self.grow_tree([(0, target)], next_edge, cost_to_go, weight)
+            self.next_edge[row], self.cost_to_go[row] = next_edge, cost_to_go
+
+        self.build_starts()
+        self.save()
+
+
+    # Reverse Dijkstra over the incoming edges
+    def grow_tree(self, priority_queue, next_edge, cost_to_go, weight):
+        """
+        Settles the nodes reachable backwards from the queued nodes, lowering their cost_to_go in place.
+
+        Args:
+        - priority_queue (list): (cost, node) pairs to start from
+        - next_edge (list): The next edge of every node
+        - cost_to_go (list): The remaining cost of every node
+        - weight (list): The edge costs
+        """
+
+        in_offsets, in_edges, edge_from = self.in_offsets, self.in_edges, self.edge_from
+        heappush, heappop = heapq.heappush, heapq.heappop
+        heapq.heapify(priority_queue)
+
+        while priority_queue:
+            current_cost, current_node = heappop(priority_queue)
+            if current_cost > cost_to_go[current_node]:
+                continue
+
+            # Explore the nodes with an edge into the current node
+            for index in range(in_offsets[current_node], in_offsets[current_node+1]):
+                neigh_edge = in_edges[index]
+                neigh_node = edge_from[neigh_edge]
+                tentative_cost = current_cost + weight[neigh_edge]
+
+                if tentative_cost < cost_to_go[neigh_node]:
+                    cost_to_go[neigh_node] = tentative_cost
+                    next_edge[neigh_node] = neigh_edge
+                    heappush(priority_queue, (tentative_cost, neigh_node))
+
+
+    # First edge and cost of a route starting at each node
+    def build_starts(self):
+        # The first edge also pays its source cost, so it may differ from next_edge
+        graph = self.env.graph
+        self.start_edge = np.full(self.next_edge.shape, -1, dtype = np.int32)
+        self.start_cost = np.full(self.cost_to_go.shape, np.inf)
+        self.start_cost[np.arange(len(self.targets)), self.targets] = 0
+
+        nodes = np.flatnonzero(graph.out_degree > 0)
+        for row, target in enumerate(self.targets):
+            candidate = (self.source_weight + self.weight + self.cost_to_go[row, graph.edge_to])[graph.out_edges]
+            best = np.minimum.reduceat(candidate, graph.out_offsets[nodes])
+            first = np.full(len(candidate), len(candidate))
+            is_best = np.flatnonzero(candidate == np.repeat(best, graph.out_degree[nodes]))
+            np.minimum.at(first, np.repeat(np.arange(len(nodes)), graph.out_degree[nodes])[is_best], is_best)
+
+            reachable = np.isfinite(best) & (nodes != target)
+            self.start_cost[row, nodes[reachable]] = best[reachable]
+            self.start_edge[row, nodes[reachable]] = graph.out_edges[first[:len(nodes)][reachable]]
+
+
+    # Repair the trees for the current traffic
+    def refresh(self):
+        """
+        Finds the edges whose cost changed since the trees were built and repairs every tree. Nodes whose
+        path used an edge that became more expensive are reset and settled again from their neighbours,
+        edges that became cheaper are relaxed, and only the changes are propagated.
+
+        Returns:
+        - An array of the changed edge ids (int)
+        """
+
+        weight = self.env.get_edge_weights()
+        source_weight = self.env.get_source_weights()
+        changed = np.flatnonzero(weight != self.weight)
+        increased = changed[weight[changed] > self.weight[changed]].tolist()
+        decreased = changed[weight[changed] < self.weight[changed]].tolist()
+        self.traffic_version = self.env.traffic_version
+
+        if not changed.size and np.array_equal(source_weight, self.source_weight):
+            return changed
+
+        self.weight, self.source_weight = weight, source_weight
+        weight = weight.tolist()
+        in_offsets, in_edges, out_offsets, out_edges = self.in_offsets, self.in_edges, self.out_offsets, self.out_edges
+        edge_from, edge_to = self.edge_from, self.edge_to
+
+        for row in range(len(self.targets)):
+            next_edge, cost_to_go = self.next_edge[row].tolist(), self.cost_to_go[row].tolist()
+
+            # Nodes routed over a more expensive edge and every node routed through them
+            affected = set()
+            stack = [edge_from[edge] for edge in increased if next_edge[edge_from[edge]] == edge]
+            while stack:
+                node = stack.pop()
+                if node in affected:
+                    continue
+                affected.add(node)
+                for index in range(in_offsets[node], in_offsets[node+1]):
+                    edge = in_edges[index]
+                    if next_edge[edge_from[edge]] == edge:
+                        stack.append(edge_from[edge])
+
+            # Settle the affected nodes again from their unaffected neighbours
+            priority_queue = []
+            for node in affected:
+                next_edge[node], cost_to_go[node] = -1, float('inf')
+            for node in affected:
+                for index in range(out_offsets[node], out_offsets[node+1]):
+                    edge = out_edges[index]
+                    if edge_to[edge] not in affected and weight[edge] + cost_to_go[edge_to[edge]] < cost_to_go[node]:
+                        next_edge[node], cost_to_go[node] = edge, weight[edge] + cost_to_go[edge_to[edge]]
+                if next_edge[node] >= 0:
+                    priority_queue.append((cost_to_go[node], node))
+
+            # Cheaper edges may shorten the paths of their start nodes
+            for edge in decreased:
+                if weight[edge] + cost_to_go[edge_to[edge]] < cost_to_go[edge_from[edge]]:
+                    next_edge[edge_from[edge]], cost_to_go[edge_from[edge]] = edge, weight[edge] + cost_to_go[edge_to[edge]]
+                    priority_queue.append((cost_to_go[edge_from[edge]], edge_from[edge]))
+
+            self.grow_tree(priority_queue, next_edge, cost_to_go, weight)
+            self.next_edge[row], self.cost_to_go[row] = next_edge, cost_to_go
+
+        self.build_starts()
+        self.save()
+        return changed
+
+
+    # Next edge and remaining cost of a node
+    def next_hop(self, node, destination, en_route = True):
+        """
+        Args:
+        - node (str): The ID of the current node
+        - destination (str): The ID of the destination node, one of destinations
+        - en_route (bool): Whether the node was reached over a connected edge, otherwise the route starts there
+          and its first edge also pays the source cost, as in Dijkstra.query
+
+        Returns:
+        - edge (str or None): The ID of the edge to take, None at the destination or if unreachable
+        - cost (float): The remaining cost to the destination, inf if unreachable
+        """
+
+        if self.traffic_version != self.env.traffic_version:
+            self.refresh()
+
+        row, node_index = self.row[destination], self.env.node_index[node]
+        if en_route:
+            edge, cost = self.next_edge[row, node_index], self.cost_to_go[row, node_index]
+        else:
+            edge, cost = self.start_edge[row, node_index], self.start_cost[row, node_index]
+        return (self.env.edges[edge] if edge >= 0 else None), float(cost)
+
+
+    # Follow a tree from a node
+    def route(self, start_node, destination, en_route = False):
+        """
+        Returns:
+        - node_path (list): The nodes (str) of the path, empty if unreachable
+        - edge_path (list): The edges (str) of the path, empty if unreachable
+        - cost (float): The cost of the path, inf if unreachable
+        """
+
+        edge, cost = self.next_hop(start_node, destination, en_route)
+        if cost == float('inf'):
+            return [], [], cost
+
+        row, target = self.row[destination], self.env.node_index[destination]
+        node_path, edge_path = [start_node], []
+        while edge is not None:
+            edge_index = self.env.edge_index[edge]
+            edge_path.append(edge)
+            node_path.append(self.env.nodes[self.edge_to[edge_index]])
+            next_edge = self.next_edge[row, self.edge_to[edge_index]]
+            edge = self.env.edges[next_edge] if next_edge >= 0 else None
+        return node_path, edge_path, cost
+
+
+    # Write the trees to the cache file
+    def save(self):
+        if self.cache_file is None:
+            return
+
+        # write to a temporary file first so concurrent readers never see a partial cache
+        temp_file = f'{self.cache_file}.{os.getpid()}.tmp'
+        try:
+            with open(temp_file, 'wb') as file:
+                np.savez(file, key = self.key, weight = self.weight, source_weight = self.source_weight, next_edge = self.next_edge, cost_to_go = self.cost_to_go)
+            os.replace(temp_file, self.cache_file)
+            graph.remove_stale_caches(self.env.network_file, 'trees', self.cache_file)
+        except OSError:
+            pass
+
+
+    # Read the trees from the cache file and repair them for the current traffic
+    def load(self):
+        """
+        Returns:
+        - True if the trees were loaded, False if the cache is missing, outdated or unreadable
+        """
+
+        if self.cache_file is None:
+            return False
+
+        try:
+            with np.load(self.cache_file, allow_pickle = False) as data:
+                if str(data['key']) != self.key or data['next_edge'].shape != (len(self.targets), self.env.graph.num_nodes):
+                    return False
+                self.weight, self.source_weight = data['weight'], data['source_weight']
+                self.next_edge, self.cost_to_go = data['next_edge'], data['cost_to_go']
+        except (OSError, ValueError, KeyError):
+            return False
+
+        self.build_starts()
+        self.refresh()
+        return True
+
+
+class KShortest(Dijkstra):
+    def __init__ (self, env, start_node = None, end_node = None):
+        """
+        Finds alternative routes, either the exact k shortest with Yen's algorithm or more diverse ones by
+        penalizing the edges of the routes found. Every spur search of Yen's algorithm is an A* guided by
+        the exact remaining cost of a reverse search from the destination, which removed edges can only
+        raise, and all searches reuse the workspaces of Dijkstra.
+
+        Args:
+        - env (traffic_env): The environment
+        - start_node (str): The ID of the starting node
+        - end_node (str): The ID of the ending node
+        """
+
+        # Inherit the graph, weights and workspaces from Dijkstra
+        super().__init__(env, start_node, end_node)
+        self.in_offsets = env.graph.in_offsets.tolist()
+        self.in_edges = env.graph.in_edges.tolist()
+        self.edge_stamp = [0] * env.graph.num_edges
+
+
+    # Remaining cost of every node to the target
+    def cost_to_go(self, target):
+        cost_to_go = [float('inf')] * len(self.cost)
+        cost_to_go[target] = 0
+        priority_queue = [(0, target)]
+        in_offsets, in_edges, edge_from, weight = self.in_offsets, self.in_edges, self.edge_from, self.weight
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        while priority_queue:
+            current_cost, current_node = heappop(priority_queue)
+            if current_cost > cost_to_go[current_node]:
+                continue
+            for index in range(in_offsets[current_node], in_offsets[current_node+1]):
+                neigh_edge = in_edges[index]
+                neigh_node = edge_from[neigh_edge]
+                tentative_cost = current_cost + weight[neigh_edge]
+                if tentative_cost < cost_to_go[neigh_node]:
+                    cost_to_go[neigh_node] = tentative_cost
+                    heappush(priority_queue, (tentative_cost, neigh_node))
+        return cost_to_go
+
+
+    # Shortest path from a spur node avoiding the marked nodes and edges
+    def spur_path(self, spur_node, target, generation, estimate, is_source, limit = float('inf')):
+        """
+        Runs A* from spur_node. Nodes whose visited stamp and edges whose edge stamp equal generation
+        are skipped, and the search gives up once every path left costs more than limit.
+
+        Args:
+        - spur_node (int): The index of the node to deviate from
+        - target (int): The index of the ending node
+        - generation (int): The stamp of the current search
+        - estimate (list): The remaining cost of every node without removed edges
+        - is_source (bool): Whether spur_node starts the route, its first edge then pays its source cost
+        - limit (float): The largest cost worth finding
+
+        Returns:
+        - The cost (float) from spur_node, inf if target is unreachable within limit
+        """
+
+        cost, predecessor = self.cost, self.predecessor
+        cost_stamp, visited_stamp, edge_stamp = self.cost_stamp, self.visited_stamp, self.edge_stamp
+        out_offsets, out_edges, edge_to, weight = self.out_offsets, self.out_edges, self.edge_to, self.weight
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        cost[spur_node] = 0
+        predecessor[spur_node] = -1
+        cost_stamp[spur_node] = generation
+        priority_queue = [(estimate[spur_node], spur_node)]
+
+        while priority_queue:
+            key, current_node = heappop(priority_queue)
+            if key > limit:
+                break
+            if visited_stamp[current_node] == generation:
+                continue
+            visited_stamp[current_node] = generation
+            self.expanded += 1
+            current_cost = cost[current_node]
+
+            # If the node is the end node, then stop searching.
+            if current_node == target:
+                return current_cost
+
+            # Explore the neighbors nodes
+            for index in range(out_offsets[current_node], out_offsets[current_node+1]):
+                neigh_edge = out_edges[index]
+                neigh_node = edge_to[neigh_edge]
+                if edge_stamp[neigh_edge] == generation or visited_stamp[neigh_node] == generation:
+                    continue
+
+                tentative_cost = current_cost + weight[neigh_edge]
+                if is_source and current_node == spur_node:
+                    tentative_cost += self.source_weight[neigh_edge]
+
+                if cost_stamp[neigh_node] != generation or tentative_cost < cost[neigh_node]:
+                    cost_stamp[neigh_node] = generation
+                    cost[neigh_node] = tentative_cost
+                    predecessor[neigh_node] = neigh_edge
+                    heappush(priority_queue, (tentative_cost + estimate[neigh_node], neigh_node))
+
+        return float('inf')
+
+
+    # Several shortest routes between two node ids
+    def shortest_paths_k(self, source, target, k):
+        """
+        Runs Yen's algorithm. Spur searches of a route only start at or after the node where it left the
+        route it was derived from, the earlier ones were already searched for that route. Once there are
+        enough candidates, spur searches stop at the cost of the last candidate that could be returned.
+
+        Args:
+        - source (int): The index of the starting node
+        - target (int): The index of the ending node
+        - k (int): The number of routes
+
+        Returns:
+        - A list of up to k (cost, edge ids) pairs, cheapest first
+        """
+
+        # Pick up traffic updates of the environment, the graph and workspaces are kept
+        if self.traffic_version != self.env.traffic_version:
+            self.load_weights()
+
+        self.expanded = 0
+        estimate = self.cost_to_go(target)
+        if source == target or estimate[source] == float('inf'):
+            return [(0, [])] if source == target else []
+
+        generation = self.reset()
+        cost = self.spur_path(source, target, generation, estimate, True)
+        routes = []
+        candidates = [(cost, 0, self.reconstruct_path(source, target), 0)]
+        seen = {tuple(candidates[0][2])}
+        edge_from, edge_to, weight, source_weight = self.edge_from, self.edge_to, self.weight, self.source_weight
+        counter = 1
+
+        while candidates:
+            cost, _, edge_path, deviation = heapq.heappop(candidates)
+            routes.append((cost, edge_path))
+            if len(routes) == k:
+                break
+
+            root_cost = 0
+            for position in range(len(edge_path)):
+                spur_node = edge_from[edge_path[position]]
+                if position >= deviation:
+                    generation = self.reset()
+
+                    # Remove the next edge of every earlier route with the same root, and the root nodes
+                    for _, route in routes:
+                        if len(route) > position and route[:position] == edge_path[:position]:
+                            self.edge_stamp[route[position]] = generation
+                    for edge in edge_path[:position]:
+                        self.visited_stamp[edge_from[edge]] = generation
+
+                    # Only the cheapest candidates still needed can be returned
+                    needed = k - len(routes)
+                    limit = float('inf')
+                    if len(candidates) >= needed:
+                        limit = heapq.nsmallest(needed, candidates)[-1][0] - root_cost
+
+                    spur_cost = self.spur_path(spur_node, target, generation, estimate, position == 0, limit)
+                    if spur_cost < float('inf'):
+                        new_path = edge_path[:position] + self.reconstruct_path(spur_node, target)
+                        if tuple(new_path) not in seen:
+                            seen.add(tuple(new_path))
+                            heapq.heappush(candidates, (root_cost + spur_cost, counter, new_path, position))
+                            counter += 1
+
+                root_cost += weight[edge_path[position]] + (source_weight[edge_path[position]] if position == 0 else 0)
+
+        return routes
+
+
+    # Diverse routes between two node ids
+    def penalty_paths(self, source, target, k, penalty = 0.5):
+        """
+        Repeats the shortest path search, raising the cost of the edges of every route found by penalty,
+        so later routes avoid the earlier ones.
+
+        Args:
+        - source (int): The index of the starting node
+        - target (int): The index of the ending node
+        - k (int): The number of routes
+        - penalty (float): The relative cost added to an edge each time a route uses it
+
+        Returns:
+        - A list of up to k (cost, edge ids) pairs, cheapest first by their unpenalized cost
+        """
+
+        if self.traffic_version != self.env.traffic_version:
+            self.load_weights()
+        if source == target:
+            return [(0, [])]
+
+        weight = self.weight
+        self.weight = list(weight)
+        routes, seen = [], set()
+        try:
+            for _ in range(4 * k):
+                if self.shortest_path(source, target) == float('inf'):
+                    break
+                edge_path = self.reconstruct_path(source, target)
+                for edge in edge_path:
+                    self.weight[edge] += penalty * weight[edge]
+                if tuple(edge_path) not in seen:
+                    seen.add(tuple(edge_path))
+                    routes.append((self.source_weight[edge_path[0]] + sum(weight[edge] for edge in edge_path), edge_path))
+                    if len(routes) == k:
+                        break
+        finally:
+            self.weight = weight
+        return sorted(routes, key = lambda route: route[0])
+
+
+    # Several shortest routes between two node IDs
+    def alternatives(self, start_node, end_node, k = 5, penalty = None):
+        """
+        Computes up to k alternative routes without printing.
+
+        Args:
+        - start_node (str): The ID of the starting node
+        - end_node (str): The ID of the ending node
+        - k (int): The number of routes
+        - penalty (float or None): None for the k shortest routes (Yen), otherwise the edge penalty of penalty_paths
+
+        Returns:
+        - A list of (node_path, edge_path, distance, time) tuples, cheapest first by the evaluation method,
+          with the distance (in m) from get_edge_distance and the time (in minutes) from get_edge_time
+        """
 
-        return node_path, edge_path
\ No newline at end of file
+        source = self.env.node_index[start_node]
+        target = self.env.node_index[end_node]
+        routes = []
+        found = self.shortest_paths_k(source, target, k) if penalty is None else self.penalty_paths(source, target, k, penalty)
+        for _, edge_ids in found:
+            node_path = [self.env.nodes[source]] + [self.env.nodes[self.edge_to[edge]] for edge in edge_ids]
+            edge_path = [self.env.edges[edge] for edge in edge_ids]
+            routes.append((node_path, edge_path, self.env.get_edge_distance(edge_path), self.env.get_edge_time(edge_path)))
+        return routes
@@ -1,42 +1,51 @@
 import sys
-import sumolib
-import math
 import networkx as nx
 import matplotlib.pyplot as plt
 import random
+import numpy as np
+import graph
+import render
 
 
 class traffic_env:
-    def __init__ (self, network_file, congested = [], traffic_light = [], evaluation = "", congestion_level = "", travel_speed = 80):
+    def __init__ (self, network_file, congested = [], traffic_light = [], evaluation = "", congestion_level = "", travel_speed = 80, congestion_profiles = []):
         # Parameters 
         self.network_file = network_file
-        self.net = sumolib.net.readNet(network_file)
-        self.nodes = [node.getID().upper() for node in self.net.getNodes()]
-        self.edges = [edge.getID() for edge in self.net.getEdges()]
+        self.graph, self.sumo_net = graph.load_network(network_file)
+        self.nodes = self.graph.node_ids
+        self.edges = self.graph.edge_ids
+        self.node_index = self.graph.node_index
+        self.edge_index = self.graph.edge_index
         self.action_space = [0, 1, 2, 3]
         self.state_space = self.nodes
         self.edge_label = self.decode_edges_to_label()
+        self.build_transition_table()
 
         # Define congestions edges
         if congested:
             self.congested_edges = [item[0] for item in congested]
             self.congestion_duration = [item[1] for item in congested]
             for edge in self.congested_edges:
-                if edge not in self.edges:
+                if edge not in self.edge_index:
                     sys.exit(f'The edge {edge} in congestion_edges provided does not exist') 
             print(f'Congestion edges are: {self.congested_edges}')
-        else:
+        elif congestion_level:
             if congestion_level.lower() == "low":
                 traffic_level = 0.05
             elif congestion_level.lower() == "medium":
                 traffic_level = 0.10
             elif congestion_level.lower() == "high":
                 traffic_level = 0.20
+            else:
+                sys.exit('please provide only low, medium or high as the congestion level')
 
             self.congested_edges = random.sample(self.edges, round(len(self.edges) * traffic_level))
             self.congestion_duration = [random.randint(10, 20) for i in range(len(self.congested_edges))]
             print(f'traffic: {list(zip(self.congested_edges, self.congestion_duration))}')
             print(f'num of congestions: {len(self.congested_edges)}, num of edges: {len(self.edges)}')
+        else:
+            self.congested_edges = []
+            self.congestion_duration = []
 
         # Define traffic lights nodes
         self.tl_nodes = [item[0] for item in traffic_light]
@@ -46,7 +55,7 @@ class traffic_env:
             if isinstance(nodes_lst, str):
                 nodes_lst = [nodes_lst]
             for node in nodes_lst:
-                if node not in self.nodes:
+                if node not in self.node_index:
                     sys.exit(f'The node {node} in traffic_lights provided does not exist')
         print(f'Traffic Light nodes are: {self.tl_nodes}')
 
@@ -57,6 +66,23 @@ class traffic_env:
 
         # Calculate time parameters
         self.travel_speed = travel_speed
+        self.traffic_version = 0
+        self.build_traffic_arrays()
+
+        # Time-of-day congestion, only used by time-dependent searches
+        self.congestion_profiles = {}
+        self.build_profiles(congestion_profiles)
+
+        # Cached network drawing of visualize_plot exports
+        self.renderer = None
+
+
+    # sumolib network, only parsed when the graph came from the cache and the net is asked for
+    @property
+    def net(self):
+        if self.sumo_net is None:
+            self.sumo_net = graph.read_net(self.network_file)
+        return self.sumo_net
 
 
     # Set starting and ending nodes
@@ -70,9 +96,9 @@ class traffic_env:
         """
         
         # Check if the nodes are valid
-        if start_node not in self.nodes:
+        if start_node not in self.node_index:
             sys.exit('Error: Invalid Start Node!')
-        elif end_node not in self.nodes:
+        elif end_node not in self.node_index:
             sys.exit('Error: Invalid End Node!')
         else:
             self.start_node = start_node
@@ -82,7 +108,7 @@ class traffic_env:
     # Match node to edges
     def decode_node_to_edges(self, node, direction = None):
         """
-        Given a node and direction, returns a list of edges associated with that node.
+        Given a node and direction, returns the edges associated with that node.
 
         Args:
         - node (str): The ID of the node to match to edges
@@ -92,33 +118,24 @@ class traffic_env:
             - 'outgoing': return only edges where the node is the start
 
         Returns:
-        - A list of edges (str) associated with the given node, in the specified direction if specified.
+        - A tuple of edges (str) associated with the given node, in the specified direction if specified.
         """
 
         # Check if the direction is valid
         if direction not in ('incoming', 'outgoing', None):
             sys.exit(f'Invalid direction: {direction}')
-    
-        edges = []
-        net_node = self.net.getNode(node)
+
+        # Check if node is in the nodes list
+        node_index = self.node_index.get(node)
+        if node_index is None:
+            sys.exit(f'Error: Node {node} not in Nodes Space!')
 
         # Match node and direction to return edges
         if direction == 'incoming':
-            for edge in net_node.getIncoming():
-                if edge.getToNode().getID() == node:
-                    edges.append(edge.getID())
-
+            return self.graph.incoming[node_index]
         elif direction == 'outgoing':
-            for edge in net_node.getOutgoing():
-                if edge.getFromNode().getID() == node:
-                    edges.append(edge.getID())
-
-        else:
-            for edge in net_node.getIncoming() + net_node.getOutgoing():
-                if edge.getToNode().getID() == node or edge.getFromNode().getID() == node:
-                    edges.append(edge.getID())
-        
-        return edges
+            return self.graph.outgoing[node_index]
+        return self.graph.incoming[node_index] + self.graph.outgoing[node_index]
     
 
     # Label edges based of junction from (Right -> Up -> Left -> Down)
@@ -130,39 +147,21 @@ class traffic_env:
         - A dictionary of states (str) matched with its direction.
         """
 
-        edge_labelled = {edge: None for edge in self.edges}
-        
-        def get_edge_label(node, outgoing_edges):
-            # store edge angle
-            edge_angle = []
-
-            # get the nodes outgoing
-            start_x, start_y = self.net.getNode(node).getCoord()
-            
-            # get outgoing edges
-            for edge in outgoing_edges:
-                end_node = self.decode_edge_to_node(edge)
-                end_x, end_y = self.net.getNode(end_node).getCoord()
+        return dict(zip(self.edges, self.graph.edge_action.tolist()))
 
-                x_diff = end_x - start_x
-                y_diff = end_y - start_y
 
-                # get their angle
-                angle = math.degrees(math.atan2(y_diff, x_diff))
-                edge_angle.append((edge, angle))
+    # Precompute the actions of every state
+    def build_transition_table(self):
+        """
+        Tabulates the outgoing edge of every action in every state for the agents.
 
-            # sort from 0 to 180 to -180 to 0 (Right -> Up -> Left -> Down -> Right)
-            edge_angle = sorted(edge_angle, key=lambda x: ((x[1] >= 0) * -180, x[1]))
-            
-            # label edges
-            for i in range(len(edge_angle)):
-                edge_labelled[edge_angle[i][0]] = i
+        Sets:
+        - action_edges (np.ndarray): Outgoing edge ids of each state in label order, padded with -1 to the
+          largest out-degree, so every outgoing edge is an action including labels beyond the action space
+        """
 
-        for node in self.nodes:
-            outgoing_edges = self.decode_node_to_edges(node, 'outgoing')
-            if outgoing_edges:
-                get_edge_label(node, outgoing_edges)
-        return edge_labelled
+        self.action_edges = np.full((self.graph.num_nodes, max(self.graph.out_degree.max(initial = 0), 1)), -1, dtype = np.int32)
+        self.action_edges[self.graph.edge_from, self.graph.edge_action] = np.arange(self.graph.num_edges)
 
 
     # Find the actions from a given edges
@@ -177,20 +176,15 @@ class traffic_env:
         - A list of actions (int)
         """
 
-        # Check if edges is in the edges list
+        # Check if edges is in the edges list and get the label of each edge
+        labels = set()
         for edge in edges:
-            if edge not in self.edges:
+            if edge not in self.edge_index:
                 sys.exit(f'Error: Edge {edge} not in Edges Space!')
-
-        # Get the label of each edge
-        edge_label = self.edge_label
+            labels.add(self.edge_label[edge])
 
         # Returns a list of actions
-        actions_lst = []
-        for action in self.action_space:
-            if action in [edge_label[edge] for edge in edges]:
-                actions_lst.append(action)
-        return actions_lst
+        return [action for action in self.action_space if action in labels]
 
 
     # Find the edge from a given edge and action
@@ -208,7 +202,7 @@ class traffic_env:
         
         # Check if edges is in the edges list
         for edge in edges:
-            if edge not in self.edges:
+            if edge not in self.edge_index:
                 sys.exit(f'Error: Edge {edge} not in Edges Space!')
 
         # Get the direction of each edge
@@ -236,16 +230,15 @@ class traffic_env:
         """
 
         # Check if edges is in the edges list
-        if search_edge not in self.edges:
+        edge_index = self.edge_index.get(search_edge)
+        if edge_index is None:
             sys.exit('Error: Edge not in Edges Space!')
 
-        edge = self.net.getEdge(search_edge)
-
         if direction == 'start':
-            node = edge.getFromNode().getID()
+            node = self.nodes[self.graph.edge_from[edge_index]]
 
         elif direction == 'end':  
-            node = edge.getToNode().getID()
+            node = self.nodes[self.graph.edge_to[edge_index]]
 
         return node
     
@@ -267,13 +260,306 @@ class traffic_env:
             travel_edges = [travel_edges]
 
         # Get the length of the edge
+        edge_length = self.graph.edge_length
         for edge in travel_edges:       
             # Check if edges is in the edges list
-            if edge not in self.edges:
+            edge_index = self.edge_index.get(edge)
+            if edge_index is None:
                 sys.exit(f'Error: Edge {edge} not in Edges Space!')
-            total_distance += self.net.getEdge(edge).getLength()
+            total_distance += edge_length[edge_index]
         
-        return total_distance
+        return float(total_distance)
+
+
+    # Precompute the per-edge time arrays
+    def build_traffic_arrays(self):
+        """
+        Compiles the travel speed, congestion and traffic light settings into per-edge and per-node arrays
+        used by get_edge_time and evaluate_routes.
+
+        Sets:
+        - edge_base_time (np.ndarray): Free flow time of each edge (in minutes)
+        - edge_congestion (np.ndarray): Congestion duration of each edge (in minutes)
+        - tl_groups (list): The traffic light groups as lists of nodes
+        - tl_membership (np.ndarray): Boolean matrix of nodes by traffic light groups
+        - tl_penalty (np.ndarray): Duration of each traffic light group (in minutes)
+        - node_tl_groups (list): The traffic light group indexes of each node
+        - edge_tl_entry, edge_tl_source, edge_time (np.ndarray): See build_transition_costs
+        """
+
+        self.edge_base_time = ((self.graph.edge_length/1000) / self.travel_speed) * 60
+
+        # first listed duration of an edge is used, as with list.index
+        self.edge_congestion = np.zeros(self.graph.num_edges, dtype = np.float64)
+        for edge, duration in reversed(list(zip(self.congested_edges, self.congestion_duration))):
+            self.edge_congestion[self.edge_index[edge]] = duration
+
+        self.tl_groups = [[nodes_lst] if isinstance(nodes_lst, str) else list(nodes_lst) for nodes_lst in self.tl_nodes]
+        self.tl_membership = np.zeros((self.graph.num_nodes, len(self.tl_groups)), dtype = bool)
+        for index, search_nodes in enumerate(self.tl_groups):
+            self.tl_membership[[self.node_index[node] for node in search_nodes], index] = True
+        self.tl_penalty = np.asarray(self.tl_duration, dtype = np.float64)
+        self.node_tl_groups = [tuple(np.flatnonzero(row).tolist()) for row in self.tl_membership]
+        self.build_transition_costs()
+
+
+    # Precompute the traffic light cost of every edge transition
+    def build_transition_costs(self):
+        """
+        Turns the traffic light groups into per-edge transition costs. Entering edge e after an edge ending
+        at e's start node charges the groups of e's end node that its start node is not in, so on a connected
+        route the cost of a transition only depends on the edge entered. The first edge of a route has no
+        previous edge and also charges the groups its start node shares with its end node.
+
+        Sets:
+        - edge_tl_entry (np.ndarray): Traffic light time of entering each edge from a connected edge (in minutes)
+        - edge_tl_source (np.ndarray): Extra traffic light time of each edge as the first edge of a route (in minutes)
+        - edge_time (np.ndarray): Free flow, congestion and entry traffic light time of each edge (in minutes)
+        """
+
+        from_groups = self.tl_membership[self.graph.edge_from]
+        to_groups = self.tl_membership[self.graph.edge_to]
+        self.edge_tl_entry = (to_groups & ~from_groups) @ self.tl_penalty if len(self.tl_groups) else np.zeros(self.graph.num_edges)
+        self.edge_tl_source = (to_groups & from_groups) @ self.tl_penalty if len(self.tl_groups) else np.zeros(self.graph.num_edges)
+        self.edge_time = self.edge_base_time + self.edge_congestion + self.edge_tl_entry
+
+
+    # Traffic light time of moving from one edge to the next
+    def transition_penalty(self, prev_edge, edge):
+        """
+        Args:
+        - prev_edge (int): The id of the previous edge, -1 if edge is the first edge of the route
+        - edge (int): The id of the edge entered
+
+        Returns:
+        - The traffic light time (float) charged for entering edge (in minutes)
+        """
+
+        if prev_edge < 0:
+            return self.edge_tl_entry[edge] + self.edge_tl_source[edge]
+        if self.graph.edge_to[prev_edge] == self.graph.edge_from[edge]:
+            return self.edge_tl_entry[edge]
+
+        # disconnected edges, charge the groups the previous edge did not end in
+        prev_groups = self.node_tl_groups[self.graph.edge_to[prev_edge]]
+        return sum(self.tl_penalty[index] for index in self.node_tl_groups[self.graph.edge_to[edge]] if index not in prev_groups)
+
+
+    # Current congestion and traffic lights as traffic_env arguments
+    def traffic_settings(self):
+        """
+        Returns:
+        - A dictionary of the congested, traffic_light and congestion_profiles arguments that rebuild the
+          current traffic, the random congestion of a congestion_level included, so a copy built from it
+          draws nothing
+        """
+
+        return {
+            'congested': list(zip(self.congested_edges, self.congestion_duration)),
+            'traffic_light': list(zip(self.tl_nodes, self.tl_duration)),
+            'congestion_level': '',
+            'congestion_profiles': list(self.congestion_profiles.items()),
+        }
+
+
+    # Patch the congestion and traffic lights without rebuilding the environment
+    def update_traffic(self, congested = None, traffic_light = None, congestion_profiles = None):
+        """
+        Updates the per-edge congestion and the traffic light durations in place. Search engines and
+        agents built on this environment pick up the change through traffic_version.
+
+        Args:
+        - congested (list): (edge, duration) pairs to set, a duration of 0 clears the congestion of the edge
+        - traffic_light (list): (nodes, duration) pairs, an existing group of the same nodes gets the new
+          duration, otherwise the group is added
+        - congestion_profiles (list): (edge, penalties) pairs as in build_profiles, an empty list of
+          penalties removes the profile of the edge
+
+        Returns:
+        - An array of the edge ids (int) whose time changed
+        """
+
+        changed = []
+
+        # Congested edges
+        for edge, duration in congested or []:
+            if edge not in self.edge_index:
+                sys.exit(f'The edge {edge} in congestion_edges provided does not exist')
+            edge_index = self.edge_index[edge]
+            self.edge_congestion[edge_index] = duration
+            changed.append(edge_index)
+
+            if edge in self.congested_edges:
+                position = self.congested_edges.index(edge)
+                if duration:
+                    self.congestion_duration[position] = duration
+                else:
+                    del self.congested_edges[position], self.congestion_duration[position]
+            elif duration:
+                self.congested_edges.append(edge)
+                self.congestion_duration.append(duration)
+
+        # Traffic light groups
+        for nodes_lst, duration in traffic_light or []:
+            search_nodes = [nodes_lst] if isinstance(nodes_lst, str) else list(nodes_lst)
+            for node in search_nodes:
+                if node not in self.node_index:
+                    sys.exit(f'The node {node} in traffic_lights provided does not exist')
+
+            if search_nodes in self.tl_groups:
+                index = self.tl_groups.index(search_nodes)
+                self.tl_penalty[index] = duration
+                self.tl_duration[index] = duration
+            else:
+                index = len(self.tl_groups)
+                self.tl_groups.append(search_nodes)
+                self.tl_nodes.append(nodes_lst)
+                self.tl_duration.append(duration)
+                self.tl_penalty = np.append(self.tl_penalty, float(duration))
+                self.tl_membership = np.hstack([self.tl_membership, np.zeros((self.graph.num_nodes, 1), dtype = bool)])
+                node_indexes = [self.node_index[node] for node in search_nodes]
+                self.tl_membership[node_indexes, index] = True
+                for node in node_indexes:
+                    self.node_tl_groups[node] = self.node_tl_groups[node] + (index,)
+
+            for node in search_nodes:
+                node_index = self.node_index[node]
+                changed.extend(self.graph.in_edges[self.graph.in_offsets[node_index]:self.graph.in_offsets[node_index+1]].tolist())
+                changed.extend(self.graph.out_edges[self.graph.out_offsets[node_index]:self.graph.out_offsets[node_index+1]].tolist())
+
+        # Time-of-day congestion
+        if congestion_profiles:
+            self.build_profiles(congestion_profiles)
+            changed.extend(self.edge_index[edge] for edge, _ in congestion_profiles)
+
+        self.build_transition_costs()
+        self.traffic_version += 1
+        return np.unique(np.asarray(changed, dtype = np.int64))
+
+
+    # Compile the time-of-day congestion profiles
+    def build_profiles(self, congestion_profiles):
+        """
+        Adds or replaces congestion profiles. A profile gives the congestion (in minutes) of entering an edge
+        at equally spaced times of the day starting from midnight, linearly interpolated in between and
+        wrapping around at midnight. Every profile needs the same number of samples. Profiles are raised
+        where needed so that entering an edge later never arrives earlier (FIFO), which keeps
+        time-dependent Dijkstra exact.
+
+        Args:
+        - congestion_profiles (list): (edge, penalties) pairs, penalties being a list of minutes
+
+        Sets:
+        - profile_interval (float): The minutes between two samples
+        - edge_profile (np.ndarray): Row of each edge in the profile arrays, -1 without profile
+        - profile_penalty (np.ndarray): Congestion of each profile at each sample (in minutes)
+        - profile_slope (np.ndarray): Change of the congestion per minute after each sample
+        """
+
+        for edge, penalties in congestion_profiles:
+            if edge not in self.edge_index:
+                sys.exit(f'The edge {edge} in congestion_profiles provided does not exist')
+            if len(penalties):
+                self.congestion_profiles[edge] = [float(penalty) for penalty in penalties]
+            else:
+                self.congestion_profiles.pop(edge, None)
+
+        num_samples = {len(penalties) for penalties in self.congestion_profiles.values()}
+        if len(num_samples) > 1:
+            sys.exit('please provide the same number of samples for every congestion profile')
+        num_samples = num_samples.pop() if num_samples else 1
+
+        self.profile_interval = 1440 / num_samples
+        self.edge_profile = np.full(self.graph.num_edges, -1, dtype = np.int32)
+        self.edge_profile[[self.edge_index[edge] for edge in self.congestion_profiles]] = np.arange(len(self.congestion_profiles))
+        self.profile_penalty = np.array(list(self.congestion_profiles.values()), dtype = np.float64).reshape(-1, num_samples)
+        if (self.profile_penalty < 0).any():
+            sys.exit('please provide only non-negative congestion profiles')
+
+        # FIFO, the congestion may drop by at most the time passed, two passes settle the wrap around midnight
+        for _ in range(2):
+            for sample in range(num_samples):
+                next_sample = (sample + 1) % num_samples
+                np.maximum(self.profile_penalty[:, next_sample], self.profile_penalty[:, sample] - self.profile_interval, out = self.profile_penalty[:, next_sample])
+        self.profile_slope = (np.roll(self.profile_penalty, -1, axis = 1) - self.profile_penalty) / self.profile_interval
+
+
+    # Time-of-day congestion of edges
+    def get_profile_penalty(self, edges, times):
+        """
+        Vectorized lookup of the congestion profiles.
+
+        Args:
+        - edges (np.ndarray): The edge ids
+        - times (np.ndarray or float): The times the edges are entered (in minutes since midnight, any day)
+
+        Returns:
+        - An array of the congestion (float) of each edge at its time (in minutes), 0 without profile
+        """
+
+        edges = np.asarray(edges, dtype = np.int64)
+        rows = self.edge_profile[edges]
+        penalty = np.zeros(len(edges))
+        profiled = rows >= 0
+        if profiled.any():
+            offset = np.broadcast_to(np.asarray(times, dtype = np.float64), edges.shape)[profiled] % 1440
+            sample = np.minimum((offset // self.profile_interval).astype(np.int64), self.profile_penalty.shape[1] - 1)
+            penalty[profiled] = self.profile_penalty[rows[profiled], sample] + self.profile_slope[rows[profiled], sample] * (offset - sample * self.profile_interval)
+        return penalty
+
+
+    # Time taken by a route leaving at a given time
+    def get_edge_time_at(self, travel_edges, departure_time):
+        """
+        Calculates get_edge_time with the congestion profiles of the edges at the time each one is entered.
+
+        Args:
+        - travel_edges: The list of edges of the selected route.
+        - departure_time (float): The time the route starts (in minutes since midnight)
+
+        Return:
+        - total_time (float): The total time taken to travel (in minutes)
+        """
+
+        if isinstance(travel_edges, str):
+            travel_edges = [travel_edges]
+
+        current_time = departure_time
+        prev_edge = -1
+        for edge in travel_edges:
+            edge_index = self.edge_index[edge]
+            current_time += self.get_profile_penalty([edge_index], current_time)[0]
+            current_time += self.edge_base_time[edge_index] + self.edge_congestion[edge_index] + self.transition_penalty(prev_edge, edge_index)
+            prev_edge = edge_index
+
+        return float(current_time - departure_time)
+
+
+    # Per-edge cost of the evaluation method for the search engines
+    def get_edge_weights(self):
+        """
+        Computes the cost of travelling each edge after a connected edge. Together with get_source_weights
+        for the first edge, the costs of a route add up to get_edge_distance or get_edge_time.
+
+        Returns:
+        - An array of edge costs (float) indexed by edge id
+        """
+
+        if self.evaluation in ("distance", "d"):
+            return self.graph.edge_length.copy()
+        return self.edge_time.copy()
+
+
+    # Extra cost of each edge as the first edge of a route
+    def get_source_weights(self):
+        """
+        Returns:
+        - An array of edge costs (float) indexed by edge id, added to get_edge_weights for the first edge of a route
+        """
+
+        if self.evaluation in ("distance", "d"):
+            return np.zeros(self.graph.num_edges)
+        return self.edge_tl_source.copy()
 
 
     # Find the total time taken from a given pathway of nodes and edges
@@ -297,46 +583,125 @@ class traffic_env:
             travel_edges = [travel_edges]
         
         # time punishment
-        for i in range(len(travel_edges)):
+        prev_edge = -1
+        for edge in travel_edges:
+            edge_index = self.edge_index[edge]
+
             # congested area
-            if travel_edges[i] in self.congested_edges:
-                total_time += self.congestion_duration[self.congested_edges.index(travel_edges[i])]
+            total_time += self.edge_congestion[edge_index]
             
-            # traffic light
-            prev_node = self.decode_edge_to_node(travel_edges[i-1], direction = 'end') if i > 0 else ""
-            node = self.decode_edge_to_node(travel_edges[i], direction = 'end')
+            # traffic light, entering a group the previous edge did not end in
+            total_time += self.transition_penalty(prev_edge, edge_index)
+            prev_edge = edge_index
+
+        return float(total_time)
+
+
+    # Convert routes to a ragged array of edge ids
+    def encode_routes(self, routes):
+        """
+        Converts a batch of routes to a ragged (offsets, values) pair of edge ids.
 
-            for index, search_nodes in enumerate(self.tl_nodes):
-                if node in search_nodes and prev_node not in search_nodes:
-                    total_time += self.tl_duration[index]
+        Args:
+        - routes: One of the following
+          - A list of routes, each a list of edges (str)
+          - An (offsets, values) pair of int arrays, route i being values[offsets[i]:offsets[i+1]]
+          - A padded 2D int array of edge ids, each row a route padded with -1
+
+        Returns:
+        - offsets (np.ndarray): Start of each route, of size num_routes + 1
+        - values (np.ndarray): Edge ids of all routes
+        """
+
+        if isinstance(routes, tuple):
+            offsets, values = routes
+            return np.asarray(offsets, dtype = np.int64), np.asarray(values, dtype = np.int64)
+
+        if isinstance(routes, np.ndarray):
+            mask = routes >= 0
+            offsets = np.zeros(len(routes) + 1, dtype = np.int64)
+            np.cumsum(mask.sum(axis = 1), out = offsets[1:])
+            return offsets, routes[mask].astype(np.int64)
+
+        offsets = np.zeros(len(routes) + 1, dtype = np.int64)
+        values = []
+        for index, route in enumerate(routes):
+            if isinstance(route, str):
+                route = [route]
+            for edge in route:
+                edge_index = self.edge_index.get(edge)
+                if edge_index is None:
+                    sys.exit(f'Error: Edge {edge} not in Edges Space!')
+                values.append(edge_index)
+            offsets[index+1] = len(values)
+        return offsets, np.asarray(values, dtype = np.int64)
+
+
+    # Find the distance and time of a batch of routes
+    def evaluate_routes(self, routes):
+        """
+        Vectorized get_edge_distance and get_edge_time over many routes at once.
+
+        Args:
+        - routes: The routes to evaluate, in any format accepted by encode_routes
 
-        return total_time
+        Returns:
+        - distances (np.ndarray): The total distance travelled of each route
+        - times (np.ndarray): The total time taken of each route (in minutes)
+        """
+
+        offsets, values = self.encode_routes(routes)
+        num_routes = len(offsets) - 1
+        lengths = np.diff(offsets)
+        route_index = np.repeat(np.arange(num_routes), lengths)
+
+        distances = np.bincount(route_index, weights = self.graph.edge_length[values], minlength = num_routes)
+        times = ((distances/1000) / self.travel_speed) * 60
+        times += np.bincount(route_index, weights = self.edge_congestion[values], minlength = num_routes)
+
+        # traffic light groups entered that the previous edge of the route did not end in
+        if len(self.tl_groups) and len(values):
+            first = np.zeros(len(values), dtype = bool)
+            first[offsets[:-1][lengths > 0]] = True
+            prev_values = np.roll(values, 1)
+            connected = ~first & (self.graph.edge_to[prev_values] == self.graph.edge_from[values])
+            tl_time = self.edge_tl_entry[values] + np.where(first, self.edge_tl_source[values], 0)
+
+            # disconnected edges, charge the groups the previous edge did not end in
+            disconnected = np.flatnonzero(~first & ~connected)
+            if len(disconnected):
+                entered = self.tl_membership[self.graph.edge_to[values[disconnected]]] & ~self.tl_membership[self.graph.edge_to[prev_values[disconnected]]]
+                tl_time[disconnected] = entered @ self.tl_penalty
+            times += np.bincount(route_index, weights = tl_time, minlength = num_routes)
+
+        return distances, times
 
 
     # ------ Graph Visualization ------
-    def visualize_plot(self, travel_edges):
+    def visualize_plot(self, travel_edges, output_file = None):
         """
         Plotting of network with selected route
 
         Args:
         - travel_edges (list): The list of edges of the selected route.
-        - network_files_directory (str): The directory of the network files.
-        - root_file (str): The initial name of the root file to be converted from network_file.
+        - output_file (str or None): Save the plot to this image file without showing it, the network is
+          drawn once and reused by later calls (see render.route_renderer)
 
         Return:
         - Plot of network
         """
 
-        nodes_dict = {}
-        for node in self.nodes:
-            x_coord, y_coord = self.net.getNode(node).getCoord()
-            nodes_dict[node] = (x_coord, y_coord)
+        # Headless export
+        if output_file is not None:
+            if self.renderer is None:
+                self.renderer = render.route_renderer(self)
+            return self.renderer.render(travel_edges, output_file)
+
+        nodes_dict = dict(zip(self.nodes, zip(self.graph.node_x.tolist(), self.graph.node_y.tolist())))
         
         edges_dict = {}
-        for edge in self.edges:
-            from_id = self.net.getEdge(edge).getFromNode().getID()
-            to_id = self.net.getEdge(edge).getToNode().getID()
-            edges_dict[edge] = (from_id, to_id)
+        for edge, from_index, to_index in zip(self.edges, self.graph.edge_from, self.graph.edge_to):
+            edges_dict[edge] = (self.nodes[from_index], self.nodes[to_index])
             
         # Draws the network layout
         G = nx.Graph()
@@ -374,18 +739,21 @@ class traffic_env:
 
         Args:
         - num_episodes (int): number of episodes it took for the model to converge.
-        - logs (dict): the logs of the edges and states it took to converge.
+        - logs (episode_log or dict): the logs of the edges and states it took to converge.
 
         Return:
         - Plot of the evaluation (time/distance) at each episode
         """
 
+        # episode logs are read back as edge ids, lazily when they were streamed to disk
+        routes = logs.routes(num_episodes) if hasattr(logs, 'routes') else [logs[episode][1] for episode in range(num_episodes)]
+        distances, times = self.evaluate_routes(routes)
         if self.evaluation in ("distance", "d"):
             plt.ylabel("Distance")
-            evaluation = [self.get_edge_distance(logs[episode][1]) for episode in range(num_episodes)]
+            evaluation = distances
         else:
             plt.ylabel("Time")
-            evaluation = [self.get_edge_time(logs[episode][1]) for episode in range(num_episodes)]
+            evaluation = times
 
         plt.plot(range(num_episodes), evaluation)
         plt.xlabel("Episode")          
@@ -0,0 +1,136 @@
+import os
+import numpy as np
+
+
+class episode_log:
+    def __init__ (self, env, start_node, log_file = None, flush_every = 1024):
+        """
+        Records the route of every training episode as edge ids. Without a log_file the routes are kept
+        in memory, otherwise they are appended to <log_file>.edges (int32 edge ids) and <log_file>.offsets
+        (int64 end of each route) every flush_every episodes and read back lazily through memory maps,
+        so the memory of a long run stays flat.
+
+        Args:
+        - env (traffic_env): The environment of the routes
+        - start_node (str): The ID of the node every route starts from
+        - log_file (str or None): The path of the log files without extension, existing logs are replaced
+        - flush_every (int): The number of episodes buffered before they are written to the log files
+        """
+
+        self.env = env
+        self.start_node = start_node
+        self.log_file = log_file
+        self.flush_every = flush_every
+        self.buffer = []
+        self.num_episodes = 0
+        self.num_edges = 0
+
+        if log_file is not None:
+            for path in (f'{log_file}.edges', f'{log_file}.offsets'):
+                open(path, 'wb').close()
+
+
+    # Open the log files of an earlier run
+    @classmethod
+    def read(cls, env, start_node, log_file):
+        log = cls.__new__(cls)
+        log.env, log.start_node, log.log_file, log.flush_every, log.buffer = env, start_node, log_file, 1024, []
+        log.num_episodes = os.path.getsize(f'{log_file}.offsets') // 8
+        log.num_edges = os.path.getsize(f'{log_file}.edges') // 4
+        return log
+
+
+    # Record the route of an episode
+    def append(self, edge_list):
+        self.buffer.append(edge_list)
+        self.num_episodes += 1
+        if self.log_file is not None and len(self.buffer) >= self.flush_every:
+            self.flush()
+
+
+    # Record the routes of several episodes
+    def extend(self, edge_lists):
+        self.buffer.extend(edge_lists)
+        self.num_episodes += len(edge_lists)
+        if self.log_file is not None and len(self.buffer) >= self.flush_every:
+            self.flush()
+
+
+    # Write the buffered routes to the log files
+    def flush(self):
+        if self.log_file is None or not self.buffer:
+            return
+
+        lengths = [len(edge_list) for edge_list in self.buffer]
+        with open(f'{self.log_file}.edges', 'ab') as file:
+            file.write(np.fromiter((edge for edge_list in self.buffer for edge in edge_list), dtype = np.int32, count = sum(lengths)).tobytes())
+        with open(f'{self.log_file}.offsets', 'ab') as file:
+            file.write((self.num_edges + np.cumsum(lengths, dtype = np.int64)).tobytes())
+        self.num_edges += sum(lengths)
+        self.buffer = []
+
+
+    # Routes as a ragged array of edge ids
+    def routes(self, num_episodes = None):
+        """
+        Args:
+        - num_episodes (int or None): The number of first episodes to return, all if None
+
+        Returns:
+        - offsets (np.ndarray): Start of each route, of size num_episodes + 1
+        - values (np.ndarray): Edge ids of all routes, memory-mapped when logged to disk
+        """
+
+        num_episodes = self.num_episodes if num_episodes is None else min(num_episodes, self.num_episodes)
+        offsets = np.zeros(num_episodes + 1, dtype = np.int64)
+
+        if self.log_file is None:
+            np.cumsum([len(edge_list) for edge_list in self.buffer[:num_episodes]], out = offsets[1:])
+            return offsets, np.fromiter((edge for edge_list in self.buffer[:num_episodes] for edge in edge_list), dtype = np.int64, count = offsets[-1])
+
+        self.flush()
+        if num_episodes:
+            offsets[1:] = np.memmap(f'{self.log_file}.offsets', dtype = np.int64, mode = 'r', shape = (num_episodes,))
+        if not offsets[-1]:
+            return offsets, np.zeros(0, dtype = np.int32)
+        return offsets, np.memmap(f'{self.log_file}.edges', dtype = np.int32, mode = 'r', shape = (int(offsets[-1]),))
+
+
+    # Edge ids of one episode
+    def route(self, episode):
+        if episode < 0:
+            episode += self.num_episodes
+        if not 0 <= episode < self.num_episodes:
+            raise IndexError(f'episode {episode} is not logged')
+        if self.log_file is None:
+            return list(self.buffer[episode])
+
+        offsets, values = self.routes(episode + 1)
+        return values[offsets[episode]:offsets[episode+1]].tolist()
+
+
+    # States and edges of one episode, as the logs of train
+    def __getitem__(self, episode):
+        edge_list = self.route(episode)
+        edge_to = self.env.graph.edge_to
+        return [[self.start_node] + [self.env.nodes[edge_to[edge]] for edge in edge_list], [self.env.edges[edge] for edge in edge_list]]
+
+
+    def __len__(self):
+        return self.num_episodes
+
+
+    def __iter__(self):
+        return iter(range(self.num_episodes))
+
+
+    def keys(self):
+        return range(self.num_episodes)
+
+
+    def values(self):
+        return (self[episode] for episode in range(self.num_episodes))
+
+
+    def items(self):
+        return ((episode, self[episode]) for episode in range(self.num_episodes))
@@ -0,0 +1,291 @@
+import os
+import glob
+import hashlib
+import numpy as np
+
+
+# Bump when the cached arrays change so stale caches are rebuilt
+CACHE_VERSION = 1
+
+
+class network_graph:
+    def __init__ (self, node_ids, node_x, node_y, edge_ids, edge_from, edge_to, edge_length, edge_speed, edge_lanes, compiled = None):
+        # Node and edge id <-> int maps
+        self.node_ids = list(node_ids)
+        self.edge_ids = list(edge_ids)
+        self.node_index = {node: index for index, node in enumerate(self.node_ids)}
+        self.edge_index = {edge: index for index, edge in enumerate(self.edge_ids)}
+        self.num_nodes = len(self.node_ids)
+        self.num_edges = len(self.edge_ids)
+
+        # Per-node and per-edge arrays
+        self.node_x = np.asarray(node_x, dtype = np.float64)
+        self.node_y = np.asarray(node_y, dtype = np.float64)
+        self.edge_from = np.asarray(edge_from, dtype = np.int32)
+        self.edge_to = np.asarray(edge_to, dtype = np.int32)
+        self.edge_length = np.asarray(edge_length, dtype = np.float64)
+        self.edge_speed = np.asarray(edge_speed, dtype = np.float64)
+        self.edge_lanes = np.asarray(edge_lanes, dtype = np.int32)
+
+        # CSR adjacency, edges keep their network file order within each node
+        if compiled is None:
+            self.out_offsets, self.out_edges = self.build_csr(self.edge_from)
+            self.in_offsets, self.in_edges = self.build_csr(self.edge_to)
+        else:
+            self.out_offsets, self.out_edges = compiled['out_offsets'], compiled['out_edges']
+            self.in_offsets, self.in_edges = compiled['in_offsets'], compiled['in_edges']
+        self.out_degree = np.diff(self.out_offsets).astype(np.int32)
+        self.in_degree = np.diff(self.in_offsets).astype(np.int32)
+        self.edge_action = self.build_edge_actions() if compiled is None else compiled['edge_action']
+
+        # Precomputed edge id tuples for the string based env API
+        self.outgoing = [tuple(self.edge_ids[edge] for edge in self.out_edges[self.out_offsets[node]:self.out_offsets[node+1]]) for node in range(self.num_nodes)]
+        self.incoming = [tuple(self.edge_ids[edge] for edge in self.in_edges[self.in_offsets[node]:self.in_offsets[node+1]]) for node in range(self.num_nodes)]
+
+
+    # Build the graph from a sumolib net
+    @classmethod
+    def from_net(cls, net):
+        """
+        Compiles a sumolib net into an integer indexed graph.
+
+        Args:
+        - net (sumolib.net.Net): The parsed network
+
+        Returns:
+        - A network_graph
+        """
+
+        nodes = net.getNodes()
+        edges = net.getEdges()
+        node_ids = [node.getID().upper() for node in nodes]
+        node_index = {node: index for index, node in enumerate(node_ids)}
+        coords = np.array([node.getCoord()[:2] for node in nodes], dtype = np.float64).reshape(-1, 2)
+
+        return cls(
+            node_ids = node_ids,
+            node_x = coords[:, 0],
+            node_y = coords[:, 1],
+            edge_ids = [edge.getID() for edge in edges],
+            edge_from = [node_index[edge.getFromNode().getID().upper()] for edge in edges],
+            edge_to = [node_index[edge.getToNode().getID().upper()] for edge in edges],
+            edge_length = [edge.getLength() for edge in edges],
+            edge_speed = [edge.getSpeed() for edge in edges],
+            edge_lanes = [edge.getLaneNumber() for edge in edges],
+        )
+
+
+    # Offsets and edge order of a CSR adjacency
+    def build_csr(self, edge_node):
+        """
+        Groups the edges by the given endpoint, keeping the original edge order inside each group.
+
+        Args:
+        - edge_node (np.ndarray): The endpoint node of every edge
+
+        Returns:
+        - offsets (np.ndarray): Start of each node's edges, of size num_nodes + 1
+        - edges (np.ndarray): Edge ids grouped by node
+        """
+
+        edges = np.argsort(edge_node, kind = 'stable').astype(np.int32)
+        offsets = np.zeros(self.num_nodes + 1, dtype = np.int64)
+        np.cumsum(np.bincount(edge_node, minlength = self.num_nodes), out = offsets[1:])
+        return offsets, edges
+
+
+    # Label edges based of junction from (Right -> Up -> Left -> Down)
+    def build_edge_actions(self):
+        """
+        Labels every edge with its rank among the outgoing edges of its start node,
+        ordered by angle from 0 to 180 to -180 to 0 (Right -> Up -> Left -> Down -> Right).
+
+        Returns:
+        - An array of action labels (int) indexed by edge id
+        """
+
+        x_diff = self.node_x[self.edge_to] - self.node_x[self.edge_from]
+        y_diff = self.node_y[self.edge_to] - self.node_y[self.edge_from]
+        angle = np.degrees(np.arctan2(y_diff, x_diff))[self.out_edges]
+
+        # stable sort by start node, then half plane, then angle
+        order = np.lexsort((angle, (angle >= 0) * -180, self.edge_from[self.out_edges]))
+        edge_action = np.empty(self.num_edges, dtype = np.int32)
+        edge_action[self.out_edges[order]] = np.arange(self.num_edges) - np.repeat(self.out_offsets[:-1], self.out_degree)
+        return edge_action
+
+
+    # Write the compiled graph to a cache file
+    def save(self, cache_file, source_hash):
+        """
+        Stores the compiled graph as an uncompressed .npz file.
+
+        Args:
+        - cache_file (str): The path of the cache file
+        - source_hash (str): The hash of the network file the graph was compiled from
+        """
+
+        # write to a temporary file first so concurrent readers never see a partial cache
+        temp_file = f'{cache_file}.{os.getpid()}.tmp'
+        with open(temp_file, 'wb') as file:
+            np.savez(
+                file,
+                version = CACHE_VERSION,
+                source_hash = source_hash,
+                node_ids = np.array(self.node_ids, dtype = str),
+                node_x = self.node_x,
+                node_y = self.node_y,
+                edge_ids = np.array(self.edge_ids, dtype = str),
+                edge_from = self.edge_from,
+                edge_to = self.edge_to,
+                edge_length = self.edge_length,
+                edge_speed = self.edge_speed,
+                edge_lanes = self.edge_lanes,
+                out_offsets = self.out_offsets,
+                out_edges = self.out_edges,
+                in_offsets = self.in_offsets,
+                in_edges = self.in_edges,
+                edge_action = self.edge_action,
+            )
+        os.replace(temp_file, cache_file)
+
+
+    # Read the compiled graph from a cache file
+    @classmethod
+    def load(cls, cache_file, source_hash):
+        """
+        Loads a graph written by save.
+
+        Args:
+        - cache_file (str): The path of the cache file
+        - source_hash (str): The expected hash of the network file
+
+        Returns:
+        - A network_graph, or None if the cache is missing, outdated or unreadable
+        """
+
+        try:
+            with np.load(cache_file, allow_pickle = False) as data:
+                if int(data['version']) != CACHE_VERSION or str(data['source_hash']) != source_hash:
+                    return None
+                arrays = {key: data[key] for key in data.files}
+        except (OSError, ValueError, KeyError):
+            return None
+
+        return cls(
+            node_ids = arrays['node_ids'].tolist(),
+            node_x = arrays['node_x'],
+            node_y = arrays['node_y'],
+            edge_ids = arrays['edge_ids'].tolist(),
+            edge_from = arrays['edge_from'],
+            edge_to = arrays['edge_to'],
+            edge_length = arrays['edge_length'],
+            edge_speed = arrays['edge_speed'],
+            edge_lanes = arrays['edge_lanes'],
+            compiled = arrays,
+        )
+
+
+# Hash of a network file
+def file_hash(network_file):
+    """
+    Computes the SHA-1 digest of a file.
+
+    Args:
+    - network_file (str): The path of the file
+
+    Returns:
+    - The hex digest (str)
+    """
+
+    digest = hashlib.sha1()
+    with open(network_file, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Parse a network file with sumolib
+def read_net(network_file):
+    """
+    Parses a SUMO network file, sumolib is only imported when this is called.
+
+    Args:
+    - network_file (str): The path of the .net.xml file
+
+    Returns:
+    - The sumolib.net.Net
+    """
+
+    import sumolib
+    return sumolib.net.readNet(network_file)
+
+
+# Path of the cache file next to a network file
+def cache_path(network_file, suffix = 'graph'):
+    """
+    Args:
+    - network_file (str): The path of the .net.xml file
+    - suffix (str): The kind of cached data
+
+    Returns:
+    - The path (str) of the cache file, e.g. network.net.xml -> network.graph.npz
+    """
+
+    root = network_file[:-len('.net.xml')] if network_file.endswith('.net.xml') else network_file
+    return f'{root}.{suffix}.npz'
+
+
+# Delete the superseded cache files of a kind
+def remove_stale_caches(network_file, prefix, keep):
+    """
+    Removes the cache files <network>.<prefix>_<key>.npz other than keep, so caches keyed by the
+    traffic or the nodes do not pile up next to the network file.
+
+    Args:
+    - network_file (str): The path of the .net.xml file
+    - prefix (str): The kind of cached data, e.g. matrix
+    - keep (str): The path of the cache file just written
+    """
+
+    pattern = glob.escape(cache_path(network_file, f'{prefix}_')[:-len('.npz')]) + '*.npz'
+    for stale_file in glob.glob(pattern):
+        if os.path.abspath(stale_file) != os.path.abspath(keep):
+            try:
+                os.remove(stale_file)
+            except OSError:
+                pass
+
+
+# Load the compiled graph, from the cache when it is up to date
+def load_network(network_file, use_cache = True):
+    """
+    Returns the compiled graph of a network file. The cache next to the network file is used when
+    its hash matches the network file, otherwise the network is parsed with sumolib and the cache rebuilt.
+
+    Args:
+    - network_file (str): The path of the .net.xml file
+    - use_cache (bool): Whether to read and write the cache file
+
+    Returns:
+    - graph (network_graph): The compiled graph
+    - net (sumolib.net.Net or None): The parsed network, None when the graph came from the cache
+    """
+
+    if not use_cache:
+        net = read_net(network_file)
+        return network_graph.from_net(net), net
+
+    source_hash = file_hash(network_file)
+    cache_file = cache_path(network_file)
+    graph = network_graph.load(cache_file, source_hash)
+    if graph is not None:
+        return graph, None
+
+    net = read_net(network_file)
+    graph = network_graph.from_net(net)
+    try:
+        graph.save(cache_file, source_hash)
+    except OSError:
+        pass
+    return graph, net
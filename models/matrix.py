@@ -0,0 +1,201 @@
+import os, sys
+import json
+import hashlib
+import multiprocessing as mp
+
+import numpy as np
+import graph
+import dijkstra
+
+
+# Bump when the cached arrays change so stale matrices are recomputed
+CACHE_VERSION = 1
+
+# Per-process search engine, inherited from the parent on fork or built once by init_worker
+worker_engine = None
+
+
+class cost_matrix:
+    def __init__ (self, origins, destinations, costs, path_offsets, path_edges):
+        # Node IDs of the rows and columns
+        self.origins = list(origins)
+        self.destinations = list(destinations)
+
+        # Cost of every origin/destination pair, inf if unreachable
+        self.costs = np.asarray(costs, dtype = np.float64).reshape(len(self.origins), len(self.destinations))
+
+        # Ragged edge ids of every path, pair (i, j) being path_edges[path_offsets[k]:path_offsets[k+1]] with k = i * len(destinations) + j
+        self.path_offsets = np.asarray(path_offsets, dtype = np.int64)
+        self.path_edges = np.asarray(path_edges, dtype = np.int32)
+
+
+    # Edge ids of a pair
+    def path(self, origin, destination):
+        """
+        Args:
+        - origin (str): The ID of the origin node
+        - destination (str): The ID of the destination node
+
+        Returns:
+        - An array of the edge ids (int) of the shortest path, empty if unreachable
+        """
+
+        index = self.origins.index(origin) * len(self.destinations) + self.destinations.index(destination)
+        return self.path_edges[self.path_offsets[index]:self.path_offsets[index+1]]
+
+
+    # Write the matrix to a cache file
+    def save(self, cache_file, key):
+        """
+        Stores the matrix as an uncompressed .npz file.
+
+        Args:
+        - cache_file (str): The path of the cache file
+        - key (str): The hash of the network, traffic and nodes the matrix was computed for
+        """
+
+        # write to a temporary file first so concurrent readers never see a partial cache
+        temp_file = f'{cache_file}.{os.getpid()}.tmp'
+        with open(temp_file, 'wb') as file:
+            np.savez(
+                file,
+                version = CACHE_VERSION,
+                key = key,
+                origins = np.array(self.origins, dtype = str),
+                destinations = np.array(self.destinations, dtype = str),
+                costs = self.costs,
+                path_offsets = self.path_offsets,
+                path_edges = self.path_edges,
+            )
+        os.replace(temp_file, cache_file)
+
+
+    # Read the matrix from a cache file
+    @classmethod
+    def load(cls, cache_file, key):
+        """
+        Loads a matrix written by save.
+
+        Args:
+        - cache_file (str): The path of the cache file
+        - key (str): The expected hash of the network, traffic and nodes
+
+        Returns:
+        - A cost_matrix, or None if the cache is missing, outdated or unreadable
+        """
+
+        try:
+            with np.load(cache_file, allow_pickle = False) as data:
+                if int(data['version']) != CACHE_VERSION or str(data['key']) != key:
+                    return None
+                return cls(data['origins'].tolist(), data['destinations'].tolist(), data['costs'], data['path_offsets'], data['path_edges'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+# Hash of the network, traffic state and nodes of a matrix
+def matrix_key(env, origins, destinations):
+    """
+    Args:
+    - env (traffic_env): The environment
+    - origins (list): The IDs of the origin nodes
+    - destinations (list): The IDs of the destination nodes
+
+    Returns:
+    - The SHA-1 hex digest (str)
+    """
+
+    digest = hashlib.sha1()
+    digest.update(graph.file_hash(env.network_file).encode())
+    digest.update(np.ascontiguousarray(env.get_edge_weights()).tobytes())
+    digest.update(np.ascontiguousarray(env.get_source_weights()).tobytes())
+    digest.update(json.dumps([env.evaluation, list(origins), list(destinations)]).encode())
+    return digest.hexdigest()
+
+
+# Build the search engine once per worker process
+def init_worker(env):
+    """
+    Args:
+    - env (traffic_env): The environment, inherited without copying when the pool is forked
+    """
+
+    global worker_engine
+    if worker_engine is None or worker_engine.env is not env:
+        worker_engine = dijkstra.Dijkstra(env)
+
+
+# All the destinations of one origin
+def route_origin(task):
+    """
+    Runs one multi-target Dijkstra.
+
+    Args:
+    - task (tuple): The origin node index and the list of destination node indexes
+
+    Returns:
+    - costs (list): The cost (float) to each destination
+    - paths (list): The edge ids (list) of the path to each destination, empty if unreachable
+    """
+
+    source, targets = task
+    costs = worker_engine.shortest_paths(source, targets)
+    paths = [worker_engine.reconstruct_path(source, target) if cost != float('inf') else [] for target, cost in zip(targets, costs)]
+    return costs, paths
+
+
+# Costs and paths between every origin and destination
+def compute_matrix(env, origins, destinations = None, processes = 1, use_cache = True):
+    """
+    Computes the origin x destination cost and path matrices with one multi-target search per origin,
+    spread across a process pool when processes > 1. The result is cached next to the network file
+    and reused while the network, traffic and nodes are unchanged.
+
+    Args:
+    - env (traffic_env): The environment
+    - origins (list): The IDs of the origin nodes
+    - destinations (list or None): The IDs of the destination nodes, defaults to the origins
+    - processes (int or None): The number of worker processes, None for the CPU count
+    - use_cache (bool): Whether to read and write the cache file
+
+    Returns:
+    - A cost_matrix
+    """
+
+    destinations = list(origins) if destinations is None else list(destinations)
+    origins = list(origins)
+    for node in origins + destinations:
+        if node not in env.node_index:
+            sys.exit(f'Error: Invalid Node {node}!')
+
+    if use_cache:
+        key = matrix_key(env, origins, destinations)
+        cache_file = graph.cache_path(env.network_file, f'matrix_{key[:16]}')
+        matrix = cost_matrix.load(cache_file, key)
+        if matrix is not None:
+            return matrix
+
+    targets = [env.node_index[node] for node in destinations]
+    tasks = [(env.node_index[node], targets) for node in origins]
+    processes = processes or mp.cpu_count()
+
+    init_worker(env)
+    if processes == 1 or len(tasks) == 1:
+        results = list(map(route_origin, tasks))
+    else:
+        with mp.Pool(min(processes, len(tasks)), initializer = init_worker, initargs = (env,)) as pool:
+            results = pool.map(route_origin, tasks)
+
+    costs = [cost for row_costs, _ in results for cost in row_costs]
+    paths = [path for _, row_paths in results for path in row_paths]
+    path_offsets = np.zeros(len(paths) + 1, dtype = np.int64)
+    np.cumsum([len(path) for path in paths], out = path_offsets[1:])
+    matrix = cost_matrix(origins, destinations, costs, path_offsets, [edge for path in paths for edge in path])
+
+    if use_cache:
+        try:
+            matrix.save(cache_file, key)
+            graph.remove_stale_caches(env.network_file, 'matrix', cache_file)
+        except OSError:
+            pass
+    return matrix
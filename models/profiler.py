@@ -0,0 +1,175 @@
+import json
+import time
+import types
+import heapq
+import contextlib
+
+import environment
+import agent
+import dijkstra
+import contraction
+
+
+class profile_stats:
+    def __init__ (self):
+        self.reset()
+
+
+    # Clear every counter and timer
+    def reset(self):
+        self.calls = {}
+        self.items = {}
+        self.seconds = {}
+
+
+    # Add one timed call
+    def record(self, name, seconds, items = 1):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.items[name] = self.items.get(name, 0) + items
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+
+    # Structured summary of the counters and timers
+    def report(self):
+        """
+        Returns:
+        - A dictionary with the calls, items, total seconds and mean microseconds of every timer,
+          the number of Q-table updates and the episodes trained per second
+        """
+
+        timers = {
+            name: {
+                'calls': self.calls[name],
+                'items': self.items[name],
+                'seconds': self.seconds[name],
+                'mean_us': self.seconds[name] / self.calls[name] * 1e6,
+            }
+            for name in sorted(self.calls, key = self.seconds.get, reverse = True)
+        }
+
+        episodes = sum(self.items.get(name, 0) for name in ('rl_agent.train', 'rl_agent.train_batch'))
+        train_seconds = sum(self.seconds.get(name, 0.0) for name in ('rl_agent.train', 'rl_agent.train_batch'))
+        return {
+            'timers': timers,
+            'q_updates': sum(self.items.get(name, 0) for name in ('rl_agent.learn', 'rl_agent.learn_batch')),
+            'heap_operations': sum(self.items.get(name, 0) for name in ('heapq.heappush', 'heapq.heappop')),
+            'episodes': episodes,
+            'episodes_per_second': episodes / train_seconds if train_seconds else 0.0,
+        }
+
+
+    # Write the summary to a JSON file
+    def dump(self, output_file):
+        with open(output_file, 'w') as file:
+            json.dump(self.report(), file, indent = 2)
+
+
+# Process-wide statistics filled while profiling is enabled
+stats = profile_stats()
+
+# Original attributes replaced by enable, restored by disable
+patched = {}
+
+
+# Wrap a function with a timer
+def timed(name, function, count = None):
+    """
+    Args:
+    - name (str): The name of the timer
+    - function (callable): The function to time
+    - count (callable or None): Computes the number of items of a call from its arguments after it returns, 1 if None
+
+    Returns:
+    - The wrapped function
+    """
+
+    perf_counter = time.perf_counter
+    record = stats.record
+
+    def wrapper(*args, **kwargs):
+        start_time = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(name, perf_counter() - start_time, count(args) if count else 1)
+
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+# Targets instrumented by enable, as (owner, attribute, name, count)
+def profile_targets():
+    targets = [
+        (environment.traffic_env, 'get_edge_time', None),
+        (agent.rl_agent, 'step', None),
+        (agent.rl_agent, 'learn', None),
+        (agent.rl_agent, 'learn_batch', lambda args: len(args[1])),
+        (agent.rl_agent, 'train', lambda args: len(args[0].logs)),
+        (agent.rl_agent, 'train_batch', lambda args: len(args[0].logs)),
+    ]
+
+    # Action choices of every agent, the batched ones count a choice per state
+    for learner in (agent.Q_Learning, agent.SARSA):
+        targets.append((learner, 'act', None))
+        targets.append((learner, 'act_batch', lambda args: len(args[1])))
+
+    # Searches of every engine overriding shortest_path
+    for engine in (dijkstra.Dijkstra, dijkstra.AStar, dijkstra.Bidirectional, dijkstra.TimeDependent, contraction.ContractionHierarchy):
+        if 'shortest_path' in vars(engine):
+            targets.append((engine, 'shortest_path', None))
+    return [(owner, attribute, f'{owner.__name__}.{attribute}', count) for owner, attribute, count in targets]
+
+
+# Start collecting statistics
+def enable():
+    """
+    Replaces the hot functions of the environment, agents and searches with timed wrappers, the
+    searches see counting heap functions. Nothing is wrapped while disabled so the default cost is zero.
+    """
+
+    if patched:
+        return
+
+    for owner, attribute, name, count in profile_targets():
+        patched[(owner, attribute)] = vars(owner)[attribute]
+        setattr(owner, attribute, timed(name, vars(owner)[attribute], count))
+
+    # The searches look up heapq on their module at every call
+    counting_heapq = types.SimpleNamespace(
+        heappush = timed('heapq.heappush', heapq.heappush),
+        heappop = timed('heapq.heappop', heapq.heappop),
+        heapify = timed('heapq.heapify', heapq.heapify),
+    )
+    for module in (dijkstra, contraction):
+        patched[(module, 'heapq')] = module.heapq
+        module.heapq = counting_heapq
+
+
+# Stop collecting statistics
+def disable():
+    for (owner, attribute), original in patched.items():
+        setattr(owner, attribute, original)
+    patched.clear()
+
+
+# Profile a block of code
+@contextlib.contextmanager
+def profile(output_file = None):
+    """
+    Enables profiling for the block with fresh statistics, then disables it.
+
+    Args:
+    - output_file (str or None): A JSON file to dump the statistics to at the end of the block
+
+    Returns:
+    - The profile_stats being filled
+    """
+
+    stats.reset()
+    enable()
+    try:
+        yield stats
+    finally:
+        disable()
+        if output_file:
+            stats.dump(output_file)
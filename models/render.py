@@ -0,0 +1,140 @@
+import sys
+import multiprocessing as mp
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+
+
+# Per-process renderer, inherited from the parent on fork or built once by init_worker
+worker_renderer = None
+
+
+class route_renderer:
+    def __init__ (self, env, width = 10, dpi = 100):
+        """
+        Draws the network once without pyplot, so it runs headless. Every route is drawn as an overlay on
+        the same figure, saved and removed again.
+
+        Args:
+        - env (traffic_env): The environment to draw
+        - width (float): The width of the figure (in inches), the height follows the network
+        - dpi (int): The resolution of raster exports
+        """
+
+        self.env = env
+        self.dpi = dpi
+
+        # Line segments of every edge and the node positions
+        node_xy = np.column_stack([env.graph.node_x, env.graph.node_y])
+        self.node_xy = node_xy
+        self.segments = np.stack([node_xy[env.graph.edge_from], node_xy[env.graph.edge_to]], axis = 1)
+
+        x_min, y_min = node_xy.min(axis = 0)
+        x_max, y_max = node_xy.max(axis = 0)
+        aspect = (y_max - y_min) / max(x_max - x_min, 1e-9)
+        self.figure = Figure(figsize = (width, min(max(width * aspect, 2), 4 * width)), dpi = dpi)
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_axes([0, 0, 1, 1])
+        self.axes.set_axis_off()
+        self.axes.set_aspect('equal')
+
+        # Base network layer
+        node_size = max(4, 2000 / len(node_xy))
+        self.axes.add_collection(LineCollection(self.segments, colors = 'gray', linewidths = 0.8, zorder = 1))
+        self.axes.scatter(node_xy[:, 0], node_xy[:, 1], s = node_size, c = 'black', zorder = 2)
+        self.axes.margins(0.02)
+        self.axes.autoscale_view()
+        self.node_size = node_size
+
+
+    # Edge ids of a route given as edge IDs or ids
+    def encode_route(self, travel_edges):
+        return np.asarray([self.env.edge_index[edge] if isinstance(edge, str) else edge for edge in travel_edges], dtype = np.int64)
+
+
+    # Draw a route and save it
+    def render(self, travel_edges, output_file):
+        """
+        Saves the network with the route highlighted, and in time evaluation the traffic lights and congestion.
+
+        Args:
+        - travel_edges (list): The edges (str or int) of the route
+        - output_file (str): The image file, its extension (.png, .svg, ...) sets the format
+
+        Returns:
+        - The output_file (str)
+        """
+
+        env = self.env
+        overlays = []
+
+        if env.evaluation in ("time", "t"):
+            # Highlight traffic light nodes
+            tl_nodes = [env.node_index[node] for nodes_lst in env.tl_groups for node in nodes_lst]
+            if tl_nodes:
+                overlays.append(self.axes.scatter(self.node_xy[tl_nodes, 0], self.node_xy[tl_nodes, 1], s = self.node_size * 1.5, c = 'red', zorder = 5))
+
+            # Highlight congestion edges
+            congested = np.flatnonzero(env.edge_congestion)
+            if len(congested):
+                overlays.append(self.axes.add_collection(LineCollection(self.segments[congested], colors = 'red', linewidths = 2, zorder = 3)))
+
+        # Draws the selected route
+        route = self.encode_route(travel_edges)
+        if len(route):
+            route_nodes = np.concatenate([env.graph.edge_from[route[:1]], env.graph.edge_to[route]])
+            overlays.append(self.axes.add_collection(LineCollection(self.segments[route], colors = 'green', linewidths = 3, zorder = 4)))
+            overlays.append(self.axes.scatter(self.node_xy[route_nodes, 0], self.node_xy[route_nodes, 1], s = self.node_size * 1.5, c = 'green', zorder = 6))
+
+        try:
+            self.figure.savefig(output_file, dpi = self.dpi)
+        finally:
+            for artist in overlays:
+                artist.remove()
+        return output_file
+
+
+# Build the renderer once per worker process
+def init_worker(env, width = 10, dpi = 100):
+    global worker_renderer
+    if worker_renderer is None or worker_renderer.env is not env:
+        worker_renderer = route_renderer(env, width, dpi)
+
+
+# Render one (route, file) task
+def render_task(task):
+    travel_edges, output_file = task
+    return worker_renderer.render(travel_edges, output_file)
+
+
+# Export many routes at once
+def export_routes(env, routes, output_files, processes = 1, width = 10, dpi = 100):
+    """
+    Renders every route to its own image file, drawing the base network once per process.
+
+    Args:
+    - env (traffic_env): The environment
+    - routes (list): The routes, each a list of edges (str or int)
+    - output_files (list): The image file of each route
+    - processes (int or None): The number of worker processes, None for the CPU count
+    - width (float): The width of the figures (in inches)
+    - dpi (int): The resolution of raster exports
+
+    Returns:
+    - The list of written files (str)
+    """
+
+    if len(routes) != len(output_files):
+        sys.exit('Error: routes and output_files must have the same length!')
+
+    tasks = [(list(route), output_file) for route, output_file in zip(routes, output_files)]
+    processes = processes or mp.cpu_count()
+
+    if processes == 1 or len(tasks) <= 1:
+        init_worker(env, width, dpi)
+        return list(map(render_task, tasks))
+
+    with mp.Pool(min(processes, len(tasks)), initializer = init_worker, initargs = (env, width, dpi)) as pool:
+        return pool.map(render_task, tasks, chunksize = max(1, len(tasks) // (4 * processes)))
@@ -0,0 +1,253 @@
+import io
+import json
+import time
+import asyncio
+import contextlib
+import collections
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import environment
+import batch
+
+
+# Per-process routing state, built once per worker process by init_worker
+worker_env = None
+worker_engine = None
+
+
+# Load the environment and routing engine once per worker process
+def init_worker(env_settings, traffic_version, algorithm = 'Dijkstra'):
+    """
+    Args:
+    - env_settings (dict): The keyword arguments of traffic_env with the traffic at the time the pool was started
+    - traffic_version (int): The traffic version of the server at that time
+    - algorithm (str): The search class, one of batch.ENGINES
+    """
+
+    global worker_env, worker_engine
+    with contextlib.redirect_stdout(io.StringIO()):
+        worker_env = environment.traffic_env(**env_settings)
+    worker_env.traffic_version = traffic_version
+    worker_engine = batch.ENGINES[algorithm](worker_env)
+
+
+# Search one origin/destination pair
+def route_task(start_node, end_node, updates = ()):
+    """
+    Args:
+    - start_node (str): The ID of the starting node
+    - end_node (str): The ID of the ending node
+    - updates (tuple): The (traffic version, update_traffic arguments) of the server since the pool started,
+      the ones the worker has not applied yet are applied before searching
+
+    Returns:
+    - The node path (list), edge path (list) and cost (float or None if unreachable)
+    """
+
+    for version, update in updates:
+        if version > worker_env.traffic_version:
+            worker_env.update_traffic(**update)
+            worker_env.traffic_version = version
+    node_path, edge_path, cost = worker_engine.query(start_node, end_node)
+    return node_path, edge_path, None if cost == float('inf') else cost
+
+
+class route_server:
+    def __init__ (self, env_settings, algorithm = 'Dijkstra', processes = 1, cache_size = 4096, max_updates = 32):
+        """
+        Answers line-delimited JSON route queries over TCP. The environment stays loaded in the server,
+        searches run on a pool of worker processes and answers are kept in an LRU cache keyed by
+        (start, end, evaluation, traffic version), so a repeated query is answered without searching.
+        Workers load the environment once and receive traffic updates along with the queries.
+
+        Args:
+        - env_settings (dict): The keyword arguments of traffic_env
+        - algorithm (str): The search class, one of batch.ENGINES
+        - processes (int or None): The number of worker processes, None for the CPU count
+        - cache_size (int): The number of answers kept in the cache
+        - max_updates (int): The number of traffic updates sent along with the queries before the
+          workers are restarted on the current traffic
+        """
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.env = environment.traffic_env(**env_settings)
+        self.algorithm = algorithm
+        self.processes = processes or mp.cpu_count()
+        self.cache_size = cache_size
+        self.max_updates = max_updates
+        self.cache = collections.OrderedDict()
+        self.pending = {}
+        self.stats = {'queries': 0, 'hits': 0, 'searches': 0, 'updates': 0}
+        self.pool = None
+        self.start_pool()
+
+
+    # Start the worker processes on the current traffic
+    def start_pool(self):
+        # Workers are started from a fork server, or spawned where there is none, a plain fork would copy
+        # the open client sockets and keep them from closing. They load the environment from its settings,
+        # the parsed SUMO network of the server cannot be pickled.
+        if self.pool is not None:
+            self.pool.shutdown(wait = False)
+        context = mp.get_context('forkserver' if 'forkserver' in mp.get_all_start_methods() else 'spawn')
+        env_settings = dict(network_file = self.env.network_file, evaluation = self.env.evaluation, travel_speed = self.env.travel_speed, **self.env.traffic_settings())
+        self.pool = ProcessPoolExecutor(self.processes, context, init_worker, (env_settings, self.env.traffic_version, self.algorithm))
+        self.updates = ()
+
+        # Load the workers before the first query arrives
+        for _ in range(self.processes):
+            self.pool.submit(int)
+
+
+    # Cache key of a query
+    def cache_key(self, start_node, end_node):
+        return (start_node, end_node, self.env.evaluation, self.env.traffic_version)
+
+
+    # Answer one route query
+    async def route(self, query):
+        """
+        Args:
+        - query (dict): The 'start' and 'end' node IDs and an optional 'id'
+
+        Returns:
+        - A result dictionary with the node path, edge path, cost and latency, or an error
+        """
+
+        start_time = time.perf_counter()
+        self.stats['queries'] += 1
+        start_node, end_node = str(query['start']), str(query['end'])
+        result = {'id': query.get('id'), 'start': start_node, 'end': end_node}
+
+        if start_node not in self.env.node_index:
+            result['error'] = 'Invalid Start Node'
+            return result
+        if end_node not in self.env.node_index:
+            result['error'] = 'Invalid End Node'
+            return result
+
+        key = self.cache_key(start_node, end_node)
+        answer = self.cache.get(key)
+        result['cached'] = answer is not None
+
+        if answer is not None:
+            self.stats['hits'] += 1
+            self.cache.move_to_end(key)
+        else:
+            # Identical queries arriving during a search wait for the same search
+            future = self.pending.get(key)
+            if future is None:
+                self.stats['searches'] += 1
+                future = asyncio.get_running_loop().run_in_executor(self.pool, route_task, start_node, end_node, self.updates)
+                self.pending[key] = future
+                try:
+                    answer = await future
+                finally:
+                    del self.pending[key]
+                self.cache[key] = answer
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last = False)
+            else:
+                answer = await future
+
+        result['node_path'], result['edge_path'], result['cost'] = answer
+        result['traffic_version'] = key[3]
+        result['latency_ms'] = (time.perf_counter() - start_time) * 1000
+        return result
+
+
+    # Apply a traffic update
+    def update(self, congested = None, traffic_light = None, congestion_profiles = None):
+        """
+        Patches the traffic of the environment and drops the cached answers. The workers apply the
+        update before their next search, searches already running finish on the old traffic.
+
+        Args:
+        - congested (list): (edge, duration) pairs as in update_traffic
+        - traffic_light (list): (nodes, duration) pairs as in update_traffic
+        - congestion_profiles (list): (edge, penalties) pairs as in update_traffic
+
+        Returns:
+        - A dictionary with the new traffic version and the number of changed edges, or an error
+        """
+
+        update = {
+            'congested': [tuple(item) for item in congested] if congested else None,
+            'traffic_light': [tuple(item) for item in traffic_light] if traffic_light else None,
+            'congestion_profiles': [tuple(item) for item in congestion_profiles] if congestion_profiles else None,
+        }
+
+        # Check the update first, update_traffic stops at the first invalid item
+        for edge, _ in (update['congested'] or []) + (update['congestion_profiles'] or []):
+            if edge not in self.env.edge_index:
+                return {'error': f'The edge {edge} does not exist'}
+        for nodes_lst, _ in update['traffic_light'] or []:
+            for node in [nodes_lst] if isinstance(nodes_lst, str) else nodes_lst:
+                if node not in self.env.node_index:
+                    return {'error': f'The node {node} does not exist'}
+        for _, penalties in update['congestion_profiles'] or []:
+            if min(penalties, default = 0) < 0:
+                return {'error': 'Congestion profiles must be non-negative'}
+
+        changed = self.env.update_traffic(**update)
+        self.stats['updates'] += 1
+        self.cache.clear()
+        if len(self.updates) >= self.max_updates:
+            self.start_pool()
+        else:
+            self.updates += ((self.env.traffic_version, update),)
+        return {'traffic_version': self.env.traffic_version, 'changed_edges': len(changed)}
+
+
+    # Answer one JSON line
+    async def handle_line(self, line):
+        try:
+            request = json.loads(line)
+            if 'update' in request:
+                response = self.update(**request['update'])
+            elif 'stats' in request:
+                response = dict(self.stats, cache_entries = len(self.cache), traffic_version = self.env.traffic_version)
+            else:
+                response = await self.route(request)
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            response = {'error': f'Invalid query: {error}', 'query': line.strip()}
+        except SystemExit as error:
+            # update_traffic reports invalid edges and nodes through sys.exit
+            response = {'error': str(error), 'query': line.strip()}
+        return json.dumps(response) + '\n'
+
+
+    # Serve one connection
+    async def handle_connection(self, reader, writer):
+        # Lines are answered concurrently and written back in the order they arrived
+        answers = asyncio.Queue()
+
+        async def write_answers():
+            while (answer := await answers.get()) is not None:
+                writer.write((await answer).encode())
+                await writer.drain()
+
+        write_task = asyncio.create_task(write_answers())
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    await answers.put(asyncio.create_task(self.handle_line(line.decode())))
+            await answers.put(None)
+            await write_task
+        except ConnectionError:
+            pass
+        finally:
+            write_task.cancel()
+            writer.close()
+
+
+    # Listen for connections
+    async def serve(self, host = '127.0.0.1', port = 8765):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f'Serving routes on {", ".join(str(sock.getsockname()) for sock in server.sockets)}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown()
@@ -0,0 +1,185 @@
+import io
+import csv
+import time
+import random
+import itertools
+import contextlib
+import multiprocessing as mp
+
+import numpy as np
+import environment
+import agent
+
+
+# Columns of the results table
+RESULT_FIELDS = ['agent', 'learning_rate', 'discount_factor', 'exploration_rate', 'num_episodes', 'threshold', 'seed', 'converged', 'episodes', 'wall_seconds', 'cost', 'route']
+
+# Per-process environment, inherited from the parent on fork or loaded once by init_worker
+worker_env = None
+worker_route = None
+
+
+# Expand a search space into every combination
+def grid_configs(space, agents = ('Q_Learning', 'SARSA'), seeds = (0,)):
+    """
+    Builds a grid search over the hyperparameters.
+
+    Args:
+    - space (dict): Lists of values for 'learning_rate', 'discount_factor', 'exploration_rate', 'num_episodes' and 'threshold'
+    - agents (tuple): The agent classes to tune, by name
+    - seeds (tuple): The random seeds every configuration is run with
+
+    Returns:
+    - A list of configurations (dict), exploration_rate is None for Q_Learning which does not explore
+    """
+
+    configs = []
+    for agent_name in agents:
+        exploration_rates = space['exploration_rate'] if agent_name == 'SARSA' else [None]
+        for learning_rate, discount_factor, exploration_rate, num_episodes, threshold, seed in itertools.product(
+            space['learning_rate'], space['discount_factor'], exploration_rates, space['num_episodes'], space['threshold'], seeds):
+            configs.append({
+                'agent': agent_name,
+                'learning_rate': learning_rate,
+                'discount_factor': discount_factor,
+                'exploration_rate': exploration_rate,
+                'num_episodes': num_episodes,
+                'threshold': threshold,
+                'seed': seed,
+            })
+    return configs
+
+
+# Draw random configurations from a search space
+def random_configs(space, num_samples, agents = ('Q_Learning', 'SARSA'), seeds = (0,), sample_seed = None):
+    """
+    Builds a random search over the hyperparameters. A (low, high) tuple of floats is sampled uniformly,
+    a list is sampled from its values.
+
+    Args:
+    - space (dict): The values or ranges of 'learning_rate', 'discount_factor', 'exploration_rate', 'num_episodes' and 'threshold'
+    - num_samples (int): The number of configurations drawn per agent
+    - agents (tuple): The agent classes to tune, by name
+    - seeds (tuple): The random seeds every configuration is run with
+    - sample_seed (int or None): The seed of the sampler
+
+    Returns:
+    - A list of configurations (dict)
+    """
+
+    sampler = random.Random(sample_seed)
+
+    def draw(values):
+        if isinstance(values, tuple):
+            return sampler.uniform(*values)
+        return sampler.choice(values)
+
+    configs = []
+    for agent_name in agents:
+        for _ in range(num_samples):
+            config = {
+                'agent': agent_name,
+                'learning_rate': draw(space['learning_rate']),
+                'discount_factor': draw(space['discount_factor']),
+                'exploration_rate': draw(space['exploration_rate']) if agent_name == 'SARSA' else None,
+                'num_episodes': draw(space['num_episodes']),
+                'threshold': draw(space['threshold']),
+            }
+            configs.extend(dict(config, seed = seed) for seed in seeds)
+    return configs
+
+
+# Load the environment once per worker process
+def init_worker(env_settings, start_node, end_node):
+    """
+    Prepares the environment of a worker process. When the pool is forked the environment
+    loaded by the parent is reused, otherwise it is built from env_settings.
+
+    Args:
+    - env_settings (dict): The keyword arguments of traffic_env, with the traffic resolved by the parent
+    - start_node (str): The ID of the starting node
+    - end_node (str): The ID of the ending node
+    """
+
+    global worker_env, worker_route
+    if worker_env is None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            worker_env = environment.traffic_env(**env_settings)
+    worker_route = (start_node, end_node)
+
+
+# Train one configuration
+def run_config(config):
+    """
+    Trains an agent with one configuration, a run that does not converge is recorded instead of exiting.
+
+    Args:
+    - config (dict): The agent name, hyperparameters and seed
+
+    Returns:
+    - A result row (dict) with the episodes to converge, wall time and route cost
+    """
+
+    parameters = {'learning_rate': config['learning_rate'], 'discount_factor': config['discount_factor']}
+    if config['agent'] == 'SARSA':
+        parameters['exploration_rate'] = config['exploration_rate']
+
+    np.random.seed(config['seed'])
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        learner = getattr(agent, config['agent'])(worker_env, *worker_route, **parameters)
+        result = learner.train(config['num_episodes'], config['threshold'], exit_on_failure = False)
+    wall_seconds = time.perf_counter() - start_time
+
+    row = dict(config, converged = result is not None, episodes = None, wall_seconds = round(wall_seconds, 4), cost = None, route = None)
+    if result is not None:
+        node_path, edge_path, episode, _ = result
+        row['episodes'] = episode + 1
+        row['cost'] = round(learner.evaluate([worker_env.edge_index[edge] for edge in edge_path]), 4)
+        row['route'] = ' '.join(node_path)
+    return row
+
+
+# Train every configuration
+def run_sweep(env_settings, start_node, end_node, configs, output_file, processes = None):
+    """
+    Runs the configurations across a process pool sharing one loaded environment and writes
+    the results table as CSV in the order of the configurations.
+
+    Args:
+    - env_settings (dict): The keyword arguments of traffic_env
+    - start_node (str): The ID of the starting node
+    - end_node (str): The ID of the ending node
+    - configs (list): The configurations from grid_configs or random_configs
+    - output_file (str): The CSV file to write the results to
+    - processes (int or None): The number of worker processes, defaults to the CPU count
+
+    Returns:
+    - The list of result rows (dict)
+    """
+
+    global worker_env
+    worker_env = environment.traffic_env(**env_settings)
+    worker_env.set_start_end(start_node, end_node)
+
+    # Workers that load their own environment get the parent's traffic instead of drawing new congestion
+    worker_settings = dict(env_settings, **worker_env.traffic_settings())
+    processes = processes or mp.cpu_count()
+    rows = []
+
+    with open(output_file, 'w', newline = '') as results:
+        writer = csv.DictWriter(results, fieldnames = RESULT_FIELDS)
+        writer.writeheader()
+
+        if processes == 1:
+            init_worker(worker_settings, start_node, end_node)
+            for row in map(run_config, configs):
+                writer.writerow(row)
+                rows.append(row)
+        else:
+            with mp.Pool(processes, initializer = init_worker, initargs = (worker_settings, start_node, end_node)) as pool:
+                for row in pool.imap(run_config, configs):
+                    writer.writerow(row)
+                    rows.append(row)
+
+    return rows
@@ -0,0 +1,44 @@
+import sys
+import json
+import argparse
+import datetime
+
+sys.path.append('models/')
+import batch
+from main import sumo_configuration
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Answer origin/destination queries from a JSONL file with Dijkstra')
+    parser.add_argument('network_file', help = 'the SUMO .net.xml network file')
+    parser.add_argument('input_file', help = 'JSONL file of queries, one {"id": ..., "start": ..., "end": ...} per line')
+    parser.add_argument('output_file', help = 'JSONL file to write the routes to')
+    parser.add_argument('--evaluation', default = 'd', help = 'distance, d or time, t')
+    parser.add_argument('--traffic', help = 'JSON file with "congested" [[edge, minutes], ...] and "traffic_light" [[nodes, minutes], ...]')
+    parser.add_argument('--congestion-level', default = '', help = 'low, medium or high random congestion when --traffic has none')
+    parser.add_argument('--algorithm', default = 'Dijkstra', choices = ['Dijkstra', 'AStar', 'Bidirectional', 'ContractionHierarchy'], help = 'the search used for every query')
+    parser.add_argument('--processes', type = int, default = None, help = 'number of worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    # 01 Setup SUMO
+    sumo_configuration()
+
+    # 02 Configure network variables
+    traffic = {}
+    if args.traffic:
+        with open(args.traffic) as traffic_file:
+            traffic = json.load(traffic_file)
+
+    env_settings = {
+        'network_file': args.network_file,
+        'congested': [tuple(item) for item in traffic.get('congested', [])],
+        'traffic_light': [tuple(item) for item in traffic.get('traffic_light', [])],
+        'evaluation': args.evaluation,
+        'congestion_level': args.congestion_level,
+    }
+
+    # 03 Route all queries
+    start_time = datetime.datetime.now()
+    num_queries = batch.run_batch(env_settings, args.input_file, args.output_file, args.processes, algorithm = args.algorithm)
+    processing_seconds = (datetime.datetime.now() - start_time).total_seconds()
+    print(f'Routed {num_queries} queries in {processing_seconds} seconds')
@@ -0,0 +1,45 @@
+import sys
+import json
+import argparse
+
+sys.path.append('models/')
+import benchmark
+from main import sumo_configuration
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmark the environment, Dijkstra and the agents on the bundled networks')
+    parser.add_argument('output_file', help = 'JSON file to write the results to')
+    parser.add_argument('--networks', nargs = '+', default = list(benchmark.NETWORKS), choices = list(benchmark.NETWORKS))
+    parser.add_argument('--congestion-levels', nargs = '+', default = ['low', 'medium', 'high'], choices = ['low', 'medium', 'high'])
+    parser.add_argument('--evaluation', default = 't', help = 'distance, d or time, t')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--repeat', type = int, default = 5, help = 'timed runs per benchmark, the median is kept')
+    parser.add_argument('--compare', help = 'JSON results of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type = float, default = 0.2, help = 'allowed relative slowdown against --compare')
+    parser.add_argument('--min-time', type = float, default = 1.0, help = 'benchmarks faster than this (in ms) are not compared')
+    args = parser.parse_args()
+
+    # A median of fewer runs is too noisy to compare
+    if args.compare and args.repeat < 5:
+        sys.exit('Error: --compare needs --repeat 5 or more!')
+
+    # 01 Setup SUMO
+    sumo_configuration()
+
+    # 02 Run the benchmarks
+    report = benchmark.run_benchmarks(args.networks, args.congestion_levels, args.evaluation, args.seed, args.repeat)
+    with open(args.output_file, 'w') as output_file:
+        json.dump(report, output_file, indent = 2)
+
+    for result in report['results']:
+        print(f'{result["network"]:<8}{result["congestion_level"]:<8}{result["benchmark"]:<24}{result["seconds"] * 1000:>12.3f} ms{result["rate"]:>14.1f} {result["unit"]}')
+
+    # 03 Check for regressions
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = benchmark.compare_results(json.load(baseline_file), report, args.tolerance, args.min_time / 1000)
+        for (network, congestion_level, evaluation, name), previous, current in regressions:
+            print(f'Regression: {network} {congestion_level} {evaluation} {name} {previous * 1000:.3f} ms -> {current * 1000:.3f} ms')
+        if regressions:
+            sys.exit(f'{len(regressions)} benchmarks are more than {args.tolerance:.0%} slower')
@@ -0,0 +1,47 @@
+import sys
+import json
+import asyncio
+import argparse
+
+sys.path.append('models/')
+import batch
+import server
+from main import sumo_configuration
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Serve route queries as line-delimited JSON over TCP')
+    parser.add_argument('network_file', help = 'the SUMO .net.xml network file')
+    parser.add_argument('--evaluation', default = 'd', help = 'distance, d or time, t')
+    parser.add_argument('--traffic', help = 'JSON file with "congested" [[edge, minutes], ...] and "traffic_light" [[nodes, minutes], ...]')
+    parser.add_argument('--congestion-level', default = '', help = 'low, medium or high random congestion when --traffic has none')
+    parser.add_argument('--algorithm', default = 'Dijkstra', choices = list(batch.ENGINES), help = 'the search used for every query')
+    parser.add_argument('--processes', type = int, default = 1, help = 'number of worker processes, 0 for the CPU count')
+    parser.add_argument('--cache-size', type = int, default = 4096, help = 'number of routes kept in the cache')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8765)
+    args = parser.parse_args()
+
+    # 01 Setup SUMO
+    sumo_configuration()
+
+    # 02 Configure network variables
+    traffic = {}
+    if args.traffic:
+        with open(args.traffic) as traffic_file:
+            traffic = json.load(traffic_file)
+
+    env_settings = {
+        'network_file': args.network_file,
+        'congested': [tuple(item) for item in traffic.get('congested', [])],
+        'traffic_light': [tuple(item) for item in traffic.get('traffic_light', [])],
+        'evaluation': args.evaluation,
+        'congestion_level': args.congestion_level,
+    }
+
+    # 03 Serve queries until interrupted
+    route_server = server.route_server(env_settings, args.algorithm, args.processes, args.cache_size)
+    try:
+        asyncio.run(route_server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,75 @@
+import sys
+import json
+import argparse
+import datetime
+
+sys.path.append('models/')
+import sweep
+from main import sumo_configuration
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Sweep the Q_Learning and SARSA hyperparameters over a process pool')
+    parser.add_argument('network_file', help = 'the SUMO .net.xml network file')
+    parser.add_argument('start_node', help = 'the ID of the starting node')
+    parser.add_argument('end_node', help = 'the ID of the ending node')
+    parser.add_argument('output_file', help = 'CSV file to write the results table to')
+    parser.add_argument('--agents', nargs = '+', default = ['Q_Learning', 'SARSA'], choices = ['Q_Learning', 'SARSA'])
+    parser.add_argument('--learning-rate', nargs = '+', type = float, default = [0.5, 0.7, 0.9])
+    parser.add_argument('--discount-factor', nargs = '+', type = float, default = [0.1, 0.5, 0.9])
+    parser.add_argument('--exploration-rate', nargs = '+', type = float, default = [0.05, 0.1, 0.2], help = 'SARSA only')
+    parser.add_argument('--num-episodes', nargs = '+', type = int, default = [5000])
+    parser.add_argument('--threshold', nargs = '+', type = int, default = [5])
+    parser.add_argument('--seeds', nargs = '+', type = int, default = [0])
+    parser.add_argument('--random', type = int, metavar = 'N', help = 'random search with N samples per agent instead of a grid, two float values are sampled as a (low, high) range')
+    parser.add_argument('--evaluation', default = 'd', help = 'distance, d or time, t')
+    parser.add_argument('--traffic', help = 'JSON file with "congested" [[edge, minutes], ...] and "traffic_light" [[nodes, minutes], ...]')
+    parser.add_argument('--congestion-level', default = '', help = 'low, medium or high random congestion when --traffic has none')
+    parser.add_argument('--processes', type = int, default = None, help = 'number of worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    # 01 Setup SUMO
+    sumo_configuration()
+
+    # 02 Configure network variables
+    traffic = {}
+    if args.traffic:
+        with open(args.traffic) as traffic_file:
+            traffic = json.load(traffic_file)
+
+    env_settings = {
+        'network_file': args.network_file,
+        'congested': [tuple(item) for item in traffic.get('congested', [])],
+        'traffic_light': [tuple(item) for item in traffic.get('traffic_light', [])],
+        'evaluation': args.evaluation,
+        'congestion_level': args.congestion_level,
+    }
+
+    # 03 Build the configurations
+    if args.random:
+        def search_range(values):
+            return tuple(values) if len(values) == 2 and all(isinstance(value, float) for value in values) else values
+
+        space = {
+            'learning_rate': search_range(args.learning_rate),
+            'discount_factor': search_range(args.discount_factor),
+            'exploration_rate': search_range(args.exploration_rate),
+            'num_episodes': args.num_episodes,
+            'threshold': args.threshold,
+        }
+        configs = sweep.random_configs(space, args.random, args.agents, args.seeds)
+    else:
+        space = {
+            'learning_rate': args.learning_rate,
+            'discount_factor': args.discount_factor,
+            'exploration_rate': args.exploration_rate,
+            'num_episodes': args.num_episodes,
+            'threshold': args.threshold,
+        }
+        configs = sweep.grid_configs(space, args.agents, args.seeds)
+
+    # 04 Train every configuration
+    start_time = datetime.datetime.now()
+    rows = sweep.run_sweep(env_settings, args.start_node, args.end_node, configs, args.output_file, args.processes)
+    processing_seconds = (datetime.datetime.now() - start_time).total_seconds()
+    print(f'Trained {len(rows)} configurations ({sum(row["converged"] for row in rows)} converged) in {processing_seconds} seconds')